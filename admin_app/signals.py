@@ -0,0 +1,12 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from admin_app.models import BannerPhrase
+from jelly_backend.graphql_cache import invalidate_graphql_cache
+
+
+@receiver(post_save, sender=BannerPhrase)
+@receiver(post_delete, sender=BannerPhrase)
+def invalidate_banner_phrase_graphql_responses(sender, instance, **kwargs):
+    cache.delete('banner_phrases')
+    invalidate_graphql_cache()
@@ -1,3 +1,30 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from admin_app.models import BannerPhrase
+from admin_app.schema import Query
+
+
+class BannerPhraseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def banner_phrases(self) -> list:
+        return [phrase.phrase for phrase in Query().resolve_banner_phrases(None)]
+
+    def test_saving_a_phrase_invalidates_the_cached_list(self):
+        phrase = BannerPhrase.objects.create(phrase='Envío gratis')
+        self.assertEqual(self.banner_phrases(), ['Envío gratis'])
+
+        phrase.phrase = 'Nuevos álbumes'
+        phrase.save()
+        self.assertEqual(self.banner_phrases(), ['Nuevos álbumes'])
+
+    def test_deleting_a_phrase_invalidates_the_cached_list(self):
+        phrase = BannerPhrase.objects.create(phrase='Envío gratis')
+        BannerPhrase.objects.create(phrase='Nuevos álbumes')
+        self.assertEqual(len(self.banner_phrases()), 2)
+
+        phrase.delete()
+        self.assertEqual(self.banner_phrases(), ['Nuevos álbumes'])
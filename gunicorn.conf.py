@@ -0,0 +1,17 @@
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+
+
+def post_worker_init(worker):
+    """
+    Loads the identity verification models in each forked worker, once Django is set up.
+    """
+    from django.conf import settings
+
+    if settings.IDENTITY_VERIFICATION_WARM_UP_WEB:
+        from users.verification_service import warm_up_identity_verification
+
+        warm_up_identity_verification()
+        worker.log.info('Identity verification models loaded in worker %s', worker.pid)
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+
+
+def _version_key(namespace: str) -> str:
+    return f'cache_version_{namespace}'
+
+
+def get_cache_version(namespace: str) -> int:
+    """
+    Returns the current version stamp of a cache namespace.
+
+    Keys built with the version stamp become unreachable when the version is bumped, so a whole
+    namespace can be invalidated without knowing which keys it contains.
+
+    :param namespace: Name of the namespace (e.g. 'product')
+    :return: Current version
+    """
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def bump_cache_version(namespace: str) -> None:
+    """
+    Invalidates every key built with the current version stamp of a namespace.
+    :param namespace: Name of the namespace
+    :return: None
+    """
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.add(_version_key(namespace), 2, timeout=None)
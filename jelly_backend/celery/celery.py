@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import celeryd_init, worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jelly_backend.settings')
 
@@ -20,3 +21,41 @@ app.conf.update(
     result_backend=os.getenv('CELERY_RESULT_BACKEND'),
     broker_url=os.getenv('CELERY_BROKER_URL'),
 )
+
+# Seconds a new worker process has to load the identity verification models
+IDENTITY_VERIFICATION_WARM_UP_TIMEOUT = 60
+
+identity_verification_worker = False
+
+
+@celeryd_init.connect
+def configure_identity_verification_worker(sender=None, conf=None, options=None, **kwargs):
+    """
+    Configures workers consuming the identity verification queue, before their processes are forked.
+    """
+    global identity_verification_worker
+    from django.conf import settings
+
+    queues = (options or {}).get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    if settings.IDENTITY_VERIFICATION_QUEUE not in queues:
+        return
+
+    identity_verification_worker = True
+    # The configuration is read from the Django settings, so the namespaced keys take precedence
+    conf['CELERY_WORKER_MAX_TASKS_PER_CHILD'] = settings.IDENTITY_VERIFICATION_MAX_TASKS_PER_CHILD
+    if settings.IDENTITY_VERIFICATION_WARM_UP:
+        conf['CELERY_WORKER_PROC_ALIVE_TIMEOUT'] = max(
+            conf.worker_proc_alive_timeout, IDENTITY_VERIFICATION_WARM_UP_TIMEOUT
+        )
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    from django.conf import settings
+
+    if identity_verification_worker and settings.IDENTITY_VERIFICATION_WARM_UP:
+        from users.verification_service import warm_up_identity_verification
+
+        warm_up_identity_verification()
@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+
+class RelatedListLoader:
+    """
+    Per-request loader that batches reverse foreign key lookups.
+
+    Graphene resolves list items one after another, so the parent resolver primes the loader with
+    every key it is about to return. The first ``load`` then fetches the related rows for all the
+    primed keys with a single ``<fk>__in`` query and answers the rest of the calls from memory.
+
+    :param model: Model of the related rows (e.g. ProductImageFile)
+    :param fk_name: Name of the foreign key pointing to the parent (e.g. 'product')
+    """
+    def __init__(self, model, fk_name: str):
+        self.model = model
+        self.fk_name = fk_name
+        self.fk_attname = model._meta.get_field(fk_name).attname
+        self._cache = {}
+        self._pending = set()
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def prime(self, keys) -> None:
+        """
+        Registers keys to be fetched in the next batch.
+        :param keys: Iterable of parent primary keys
+        :return: None
+        """
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def load(self, key) -> list:
+        """
+        Returns the related rows of a parent, dispatching a batch query if needed.
+        :param key: Primary key of the parent
+        :return: List of related model instances
+        """
+        if key not in self._cache:
+            self._pending.add(key)
+            self._dispatch()
+        return self._cache[key]
+
+    def _dispatch(self) -> None:
+        keys = list(self._pending)
+        self._pending.clear()
+
+        grouped = defaultdict(list)
+        queryset = self.get_queryset().filter(**{f'{self.fk_attname}__in': keys})
+        for row in queryset:
+            grouped[getattr(row, self.fk_attname)].append(row)
+
+        for key in keys:
+            self._cache[key] = grouped.get(key, [])
+
+
+def get_dataloader(info, name: str, factory: callable):
+    """
+    Returns the loader registered under ``name`` in the GraphQL context, creating it on first use.
+    :param info: GraphQL resolve info
+    :param name: Name of the loader
+    :param factory: Callable that builds the loader
+    :return: The loader instance
+    """
+    request = info.context
+    loaders = getattr(request, 'dataloaders', None)
+    if loaders is None:
+        loaders = {}
+        request.dataloaders = loaders
+    if name not in loaders:
+        loaders[name] = factory()
+    return loaders[name]
@@ -2,8 +2,85 @@ import os
 import jwt
 from graphql import GraphQLError
 from functools import wraps
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+
+# Fields read by the permission checks, the only ones kept in the cache. Anything else, like the
+# password hash, is loaded from the database only when accessed
+JWT_USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser', 'user_admin', 'user_status')
+
+
+def jwt_user_cache_key(user_id) -> str:
+    return f'jwt_user_{user_id}'
+
+
+def get_jwt_user(user_id):
+    """
+    Returns the user of a JWT payload. Its JWT_USER_FIELDS are cached for JWT_USER_CACHE_TIMEOUT
+    seconds and the other fields are deferred.
+    :param user_id: Primary key of the user
+    :return: The user, or an AnonymousUser if it does not exist
+    """
+    User = get_user_model()
+    cache_key = jwt_user_cache_key(user_id)
+    fields = cache.get(cache_key)
+    if fields is None:
+        try:
+            fields = User.objects.values(*JWT_USER_FIELDS).get(pk=user_id)
+        except User.DoesNotExist:
+            return AnonymousUser()
+        cache.set(cache_key, fields, timeout=settings.JWT_USER_CACHE_TIMEOUT)
+
+    # from_db takes the values in the order of the model fields
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in fields]
+    return User.from_db(User.objects.db, field_names, [fields[name] for name in field_names])
+
+
+def authenticate_jwt_request(request):
+    """
+    Authenticates a request with the JWT stored in the 'access_token' cookie.
+
+    The outcome is memoized on the request, so a GraphQL query with several guarded fields decodes
+    the token and looks up the user only once.
+
+    :param request: Django request
+    :return: The authenticated user or an AnonymousUser
+    """
+    if not hasattr(request, 'jwt_authentication'):
+        try:
+            request.jwt_authentication = (_authenticate_jwt_request(request), None)
+        except GraphQLError as e:
+            request.jwt_authentication = (None, e.message)
+
+    user, error = request.jwt_authentication
+    if error:
+        raise GraphQLError(error)
+    request.user = user
+    return user
+
+
+def _authenticate_jwt_request(request):
+    access_token = request.COOKIES.get('access_token')
+
+    if not access_token:
+        raise GraphQLError('No JWT token provided')
+
+    try:
+        secret_key = os.getenv('SECRET_KEY')
+        payload = jwt.decode(access_token, secret_key, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise GraphQLError('JWT token has expired')
+    except jwt.InvalidTokenError as e:
+        raise GraphQLError(f'Invalid JWT token: {str(e)}')
+
+    # Simular usuario basado en la carga útil del token
+    user_id = payload.get('user_id')
+    if user_id:
+        return get_jwt_user(user_id)
+    return AnonymousUser()
 
 
 def jwt_required(
@@ -18,30 +95,7 @@ def jwt_required(
         @wraps(func)
         def wrapped(root, info, *args, **kwargs):
             request = info.context
-            access_token = request.COOKIES.get('access_token')
-
-            if not access_token:
-                raise GraphQLError('No JWT token provided')
-
-            try:
-                secret_key = os.getenv('SECRET_KEY')
-                payload = jwt.decode(access_token, secret_key, algorithms=['HS256'])
-            except jwt.ExpiredSignatureError:
-                raise GraphQLError('JWT token has expired')
-            except jwt.InvalidTokenError as e:
-                raise GraphQLError(f'Invalid JWT token: {str(e)}')
-
-            # Simular usuario basado en la carga útil del token
-            user_id = payload.get('user_id')
-            if user_id:
-                User = get_user_model()
-                try:
-                    user = User.objects.get(pk=user_id)
-                except User.DoesNotExist:
-                    user = AnonymousUser()
-                request.user = user
-            else:
-                request.user = AnonymousUser()
+            authenticate_jwt_request(request)
 
             if permission_required:
                 permission_checker = permission_required()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import FieldNode, GraphQLError, OperationType, get_operation_ast, print_ast
+
+from jelly_backend.cache_versions import bump_cache_version, get_cache_version
+from jelly_backend.graphql_documents import parse_document
+
+GRAPHQL_CACHE_NAMESPACE = 'graphql'
+
+
+@lru_cache(maxsize=1024)
+def _normalize_query(query: str, operation_name: str | None) -> tuple | None:
+    """
+    Parses a query and returns its normalized text and root field names.
+    :param query: Query document as sent by the client
+    :param operation_name: Name of the operation to execute
+    :return: Tuple (normalized document, root field names), or None if the operation is not a query
+    """
+    try:
+        document = parse_document(query)
+    except GraphQLError:
+        return None
+
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+
+    root_fields = []
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        root_fields.append(selection.name.value)
+    return print_ast(document), tuple(root_fields)
+
+
+def get_auth_scope(request) -> str:
+    """
+    Returns the part of the cache key that separates anonymous and authenticated clients.
+    :param request: Django request
+    :return: 'anonymous' or a hash of the access token
+    """
+    access_token = request.COOKIES.get('access_token')
+    if not access_token:
+        return 'anonymous'
+    return 'token_' + hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def get_response_cache_key(request, query: str, variables, operation_name: str | None) -> str | None:
+    """
+    Builds the cache key of a GraphQL response.
+
+    Only queries whose root fields are all listed in GRAPHQL_RESPONSE_CACHE_FIELDS are cached,
+    because those are the fields invalidated by the catalog signals.
+
+    :param request: Django request
+    :param query: Query document
+    :param variables: Variables of the query
+    :param operation_name: Name of the operation to execute
+    :return: Cache key, or None if the response must not be cached
+    """
+    if not settings.GRAPHQL_RESPONSE_CACHE_ENABLED or not query:
+        return None
+
+    normalized = _normalize_query(query, operation_name)
+    if normalized is None:
+        return None
+    document, root_fields = normalized
+    if not set(root_fields) <= set(settings.GRAPHQL_RESPONSE_CACHE_FIELDS):
+        return None
+
+    payload = json.dumps(
+        [document, variables or {}, operation_name, get_auth_scope(request), bool(request.GET.get('pretty'))],
+        sort_keys=True,
+    )
+    version = get_cache_version(GRAPHQL_CACHE_NAMESPACE)
+    return f'graphql_response_{version}_{hashlib.sha256(payload.encode()).hexdigest()}'
+
+
+def get_cached_response(cache_key: str) -> str | None:
+    return cache.get(cache_key)
+
+
+def set_cached_response(cache_key: str, response: str) -> None:
+    cache.set(cache_key, response, timeout=settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+
+
+def invalidate_graphql_cache() -> None:
+    """
+    Invalidates every cached GraphQL response.
+    :return: None
+    """
+    bump_cache_version(GRAPHQL_CACHE_NAMESPACE)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import BREAK, ValidationRule, parse
+from graphql.validation import validate
+
+from graphene_django.settings import graphene_settings
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+PERSISTED_QUERY_HASH_MISMATCH = 'provided sha does not match query'
+PERSISTED_QUERY_INVALID = 'Invalid persisted query'
+SHA256_HASH = re.compile(r'[0-9a-f]{64}')
+
+
+@lru_cache(maxsize=1024)
+def parse_document(query: str):
+    """
+    Parses a query document, reusing the AST of documents already seen by this process.
+    :param query: Query document
+    :return: DocumentNode
+    """
+    return parse(query)
+
+
+@lru_cache(maxsize=1024)
+def validate_document(schema, query: str) -> list:
+    """
+    Validates a query document against the rules of the spec, memoizing the result per process.
+    :param schema: GraphQLSchema
+    :param query: Query document
+    :return: List of validation errors
+    """
+    return validate(schema, parse_document(query), max_errors=graphene_settings.MAX_VALIDATION_ERRORS)
+
+
+class MemoizedValidationRule(ValidationRule):
+    """
+    Reports the errors of validate_document, so each query text is validated once per process.
+
+    It replaces the rules of the spec, so it must be the only validation rule of the view. The rest
+    of the document is not visited by the rule.
+    """
+    def enter_document(self, node, *args):
+        for error in validate_document(self.context.schema, node.loc.source.body):
+            self.report_error(error)
+        return BREAK
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        self.message = message
+        self.code = code
+        super().__init__(message)
+
+
+def get_persisted_query_hash(request, data) -> str | None:
+    """
+    Reads the sha256 hash of an automatic persisted query from the request.
+
+    Follows the Apollo protocol: ``extensions.persistedQuery.sha256Hash``, sent in the body of POST
+    requests or as a JSON encoded ``extensions`` parameter of GET requests.
+
+    :param request: Django request
+    :param data: Parsed body of the request
+    :return: Hash of the query, or None if the request does not use persisted queries
+    :raises PersistedQueryError: If persistedQuery is not an object with a sha256 hex digest
+    """
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict) or extensions.get('persistedQuery') is None:
+        return None
+
+    persisted_query = extensions['persistedQuery']
+    if not isinstance(persisted_query, dict):
+        raise PersistedQueryError(PERSISTED_QUERY_INVALID, 'INVALID_PERSISTED_QUERY')
+    query_hash = persisted_query.get('sha256Hash')
+    if not isinstance(query_hash, str) or not SHA256_HASH.fullmatch(query_hash):
+        raise PersistedQueryError(PERSISTED_QUERY_INVALID, 'INVALID_PERSISTED_QUERY')
+    return query_hash
+
+
+def resolve_persisted_query(query_hash: str, query: str = None) -> str:
+    """
+    Returns the query document of a persisted query hash, registering it when the text is sent.
+    :param query_hash: sha256 hash of the query
+    :param query: Query document, sent by the client when the hash was not found
+    :return: Query document
+    """
+    cache_key = f'persisted_query_{query_hash}'
+    if query:
+        if hashlib.sha256(query.encode()).hexdigest() != query_hash:
+            raise PersistedQueryError(PERSISTED_QUERY_HASH_MISMATCH, 'INVALID_PERSISTED_QUERY')
+        cache.set(cache_key, query, timeout=settings.GRAPHQL_PERSISTED_QUERY_TIMEOUT)
+        return query
+
+    query = cache.get(cache_key)
+    if query is None:
+        raise PersistedQueryError(PERSISTED_QUERY_NOT_FOUND, 'PERSISTED_QUERY_NOT_FOUND')
+    return query
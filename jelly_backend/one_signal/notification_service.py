@@ -76,3 +76,34 @@ def send_email_via_onesignal(
         api_instance.create_notification(notification)
     except onesignal.ApiException as e:
         print(f"Exception when calling DefaultApi->create_notification: {e}")
+
+
+def send_push_notification(
+        external_user_id: str,
+        heading: str,
+        content: str,
+        data: dict = None
+) -> None:
+    """
+    Sends a push notification via OneSignal.
+    :param external_user_id: The external user id of the user (the id of the user in the system).
+    :param heading: The title of the notification.
+    :param content: The message of the notification.
+    :param data: Extra data delivered to the application.
+    :return: None
+    """
+    api_client = get_onesignal_client()
+    api_instance = default_api.DefaultApi(api_client)
+
+    notification = Notification(
+        app_id=os.getenv("ONESIGNAL_APP_ID"),
+        include_external_user_ids=[external_user_id],
+        headings={"en": heading, "es": heading},
+        contents={"en": content, "es": content},
+        data=data or {},
+    )
+
+    try:
+        api_instance.create_notification(notification)
+    except onesignal.ApiException as e:
+        print(f"Exception when calling DefaultApi->create_notification: {e}")
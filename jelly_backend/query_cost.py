@@ -0,0 +1,166 @@
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+    value_from_ast_untyped,
+)
+
+# Arguments that bound the number of items returned by a list, the resolvers only slice the list
+# when the page is given too
+PAGE_ARGUMENT = 'page'
+PAGE_SIZE_ARGUMENTS = ('page_size', 'pageSize')
+# Argument of the keyset connections, capped by paginate_by_keyset
+CONNECTION_SIZE_ARGUMENT = 'first'
+
+
+class QueryCostAnalyzer:
+    """
+    Static cost analysis of a GraphQL operation.
+
+    Every field returning an object costs 1 (leaf fields are free). List fields cost 1 for each item
+    they can return plus the cost of the selection of each item, using the requested page size, or an
+    estimate when the list is not paginated, so a query is priced by the number of objects it can make
+    the server resolve.
+
+    :param schema: GraphQLSchema
+    :param document: Validated DocumentNode
+    :param variables: Variables of the request
+    """
+    def __init__(self, schema, document, variables: dict = None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+
+    def analyze(self, operation) -> tuple:
+        """
+        Calculates the cost and depth of an operation.
+        :param operation: OperationDefinitionNode to analyze
+        :return: Tuple (cost, depth)
+        """
+        root_type = self.schema.get_root_type(operation.operation)
+        return self._selection_set_cost(root_type, operation.selection_set, depth=1, size_hint=None)
+
+    def _fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                yield from self._fields(fragment_type, selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self._fields(fragment_type, fragment.selection_set)
+
+    def _selection_set_cost(self, parent_type, selection_set, depth: int, size_hint) -> tuple:
+        cost, max_depth = 0, depth
+        for field_type, field_node in self._fields(parent_type, selection_set):
+            field_cost, field_depth = self._field_cost(field_type, field_node, depth, size_hint)
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+        return cost, max_depth
+
+    def _field_cost(self, parent_type, field_node, depth: int, size_hint) -> tuple:
+        name = field_node.name.value
+        # Introspection is answered from the schema without touching the database
+        if name.startswith('__'):
+            return 0, depth
+
+        field = parent_type.fields[name]
+        field_key = f'{parent_type.name}.{name}'
+        return_type = get_nullable_type(field.type)
+
+        if is_leaf_type(get_named_type(return_type)):
+            return settings.GRAPHQL_FIELD_COSTS.get(field_key, 0), depth
+
+        page_size = self._page_size(parent_type.fields[name], field_node) or size_hint
+        if is_list_type(return_type):
+            multiplier = page_size or settings.GRAPHQL_LIST_SIZE_ESTIMATES.get(
+                field_key, settings.GRAPHQL_DEFAULT_LIST_SIZE
+            )
+            child_hint = None
+        else:
+            # Connections receive the page size on the field and apply it to their edges
+            multiplier = 1
+            child_hint = page_size
+
+        child_cost, child_depth = self._selection_set_cost(
+            get_named_type(return_type), field_node.selection_set, depth + 1, child_hint
+        )
+        field_cost = settings.GRAPHQL_FIELD_COSTS.get(field_key, 1)
+        if is_list_type(return_type):
+            return field_cost + multiplier * (1 + child_cost), child_depth
+        return field_cost + multiplier * child_cost, child_depth
+
+    def _page_size(self, field, field_node) -> int | None:
+        arguments = {argument.name.value: argument.value for argument in field_node.arguments or ()}
+
+        # Connections return the same page size as paginate_by_keyset
+        if CONNECTION_SIZE_ARGUMENT in field.args:
+            first = self._argument_value(arguments.get(CONNECTION_SIZE_ARGUMENT))
+            if not isinstance(first, int) or first < 1:
+                first = None
+            return min(first or settings.GRAPHQL_DEFAULT_PAGE_SIZE, settings.GRAPHQL_MAX_PAGE_SIZE)
+
+        # Without a page the whole list is returned, so it is priced by its estimated size
+        if self._argument_value(arguments.get(PAGE_ARGUMENT)) is None:
+            return None
+        for name in PAGE_SIZE_ARGUMENTS:
+            value = self._argument_value(arguments.get(name))
+            if isinstance(value, int) and value > 0:
+                return value
+        return None
+
+    def _argument_value(self, value_node):
+        if value_node is None:
+            return None
+        if isinstance(value_node, VariableNode):
+            return self.variables.get(value_node.name.value)
+        return value_from_ast_untyped(value_node)
+
+
+def check_query_cost(schema, document, operation, variables: dict = None) -> dict:
+    """
+    Calculates the cost of an operation and rejects it if it exceeds the configured limits.
+    :param schema: GraphQLSchema
+    :param document: Validated DocumentNode
+    :param operation: OperationDefinitionNode to execute
+    :param variables: Variables of the request
+    :return: Dict reported in the ``cost`` extension of the response
+    """
+    cost, depth = QueryCostAnalyzer(schema, document, variables).analyze(operation)
+    report = {
+        'requested': cost,
+        'maximum': settings.GRAPHQL_MAX_QUERY_COST,
+        'depth': depth,
+        'maximumDepth': settings.GRAPHQL_MAX_QUERY_DEPTH,
+    }
+    if depth > settings.GRAPHQL_MAX_QUERY_DEPTH:
+        raise QueryCostError(
+            f'Query depth {depth} exceeds the maximum depth of {settings.GRAPHQL_MAX_QUERY_DEPTH}', report
+        )
+    if cost > settings.GRAPHQL_MAX_QUERY_COST:
+        raise QueryCostError(
+            f'Query cost {cost} exceeds the maximum cost of {settings.GRAPHQL_MAX_QUERY_COST}', report
+        )
+    return report
+
+
+class QueryCostError(GraphQLError):
+    def __init__(self, message: str, report: dict):
+        super().__init__(message, extensions={'code': 'QUERY_TOO_EXPENSIVE', 'cost': report})
+        self.report = report
@@ -0,0 +1,148 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+
+class QueryOptimizer:
+    """
+    Applies only(), select_related() and prefetch_related() to a queryset based on the fields
+    selected by a GraphQL query.
+
+    Model fields are mapped by name. Fields with a custom resolver must declare the model fields they
+    read in ``optimizer_dependencies`` on their DjangoObjectType, for example
+    ``optimizer_dependencies = {'fullname': ('first_name', 'last_name', 'nickname')}``. When a selected
+    field cannot be mapped, only() is skipped for that model so no column is ever deferred by mistake.
+
+    :param info: GraphQL resolve info of the field returning the queryset
+    """
+    def __init__(self, info):
+        self.info = info
+
+    def optimize(self, queryset, path: tuple = (), extra_fields: tuple = ()):
+        """
+        Optimizes a queryset for the current selection.
+        :param queryset: Queryset to optimize
+        :param path: Field names between the resolved field and the model objects (e.g. ('edges', 'node'))
+        :param extra_fields: Model fields the resolver needs besides the selected ones
+        :return: Optimized queryset
+        """
+        graphql_type = get_named_type(self.info.return_type)
+        field_nodes = list(self.info.field_nodes)
+        for name in path:
+            field_nodes, graphql_type = self._descend(graphql_type, field_nodes, name)
+
+        plan = self._plan(queryset.model, graphql_type, field_nodes, prefix='')
+        if plan['only'] is not None:
+            queryset = queryset.only(*plan['only'], *extra_fields)
+        if plan['select_related']:
+            queryset = queryset.select_related(*plan['select_related'])
+        if plan['prefetch_related']:
+            queryset = queryset.prefetch_related(*plan['prefetch_related'])
+        return queryset
+
+    def _selections(self, graphql_type, field_nodes):
+        for field_node in field_nodes:
+            if field_node.selection_set:
+                yield from self._flatten(graphql_type, field_node.selection_set)
+
+    def _flatten(self, graphql_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from self._flatten(graphql_type, selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.info.fragments[selection.name.value]
+                yield from self._flatten(graphql_type, fragment.selection_set)
+
+    def _descend(self, graphql_type, field_nodes, name: str) -> tuple:
+        children = [node for node in self._selections(graphql_type, field_nodes) if node.name.value == name]
+        return children, get_named_type(graphql_type.fields[name].type)
+
+    def _plan(self, model, graphql_type, field_nodes, prefix: str) -> dict:
+        graphene_type = getattr(graphql_type, 'graphene_type', None)
+        dependencies = getattr(graphene_type, 'optimizer_dependencies', {})
+        model_fields = self._model_fields(model)
+
+        only = {prefix + model._meta.pk.name}
+        select_related, prefetch_related = [], []
+        can_defer = True
+
+        children = {}
+        for node in self._selections(graphql_type, field_nodes):
+            children.setdefault(node.name.value, []).append(node)
+
+        for graphql_name, nodes in children.items():
+            if graphql_name.startswith('__'):
+                continue
+            name = to_snake_case(graphql_name)
+
+            if name in dependencies:
+                only.update(prefix + dependency for dependency in dependencies[name])
+                continue
+
+            field = model_fields.get(name)
+            if field is None:
+                can_defer = False
+                continue
+
+            child_type = get_named_type(graphql_type.fields[graphql_name].type)
+            if not field.is_relation:
+                only.add(prefix + field.name)
+            elif field.concrete and (field.many_to_one or field.one_to_one):
+                only.add(prefix + field.name)
+                select_related.append(prefix + field.name)
+                child = self._plan(field.related_model, child_type, nodes, prefix=f'{prefix}{field.name}__')
+                if child['only'] is None:
+                    can_defer = False
+                else:
+                    only.update(child['only'])
+                select_related.extend(child['select_related'])
+                prefetch_related.extend(child['prefetch_related'])
+            elif field.one_to_many:
+                prefetch_related.append(
+                    Prefetch(prefix + name, queryset=self._related_queryset(field, child_type, nodes))
+                )
+            else:
+                prefetch_related.append(prefix + name)
+
+        return {
+            'only': only if can_defer else None,
+            'select_related': select_related,
+            'prefetch_related': prefetch_related,
+        }
+
+    def _related_queryset(self, field, graphql_type, field_nodes):
+        related_model = field.related_model
+        queryset = related_model._default_manager.all()
+        plan = self._plan(related_model, graphql_type, field_nodes, prefix='')
+        if plan['only'] is not None:
+            # The foreign key is needed to attach the rows to their parent
+            queryset = queryset.only(*plan['only'], field.field.name)
+        if plan['select_related']:
+            queryset = queryset.select_related(*plan['select_related'])
+        if plan['prefetch_related']:
+            queryset = queryset.prefetch_related(*plan['prefetch_related'])
+        return queryset
+
+    @staticmethod
+    def _model_fields(model) -> dict:
+        fields = {}
+        for field in model._meta.get_fields():
+            if field.auto_created and not field.concrete and (field.one_to_many or field.many_to_many):
+                fields[field.get_accessor_name()] = field
+            else:
+                fields[field.name] = field
+        return fields
+
+
+def optimize_queryset(queryset, info, path: tuple = (), extra_fields: tuple = ()):
+    """
+    Shortcut for QueryOptimizer(info).optimize(queryset, path, extra_fields).
+    :param queryset: Queryset to optimize
+    :param info: GraphQL resolve info
+    :param path: Field names between the resolved field and the model objects
+    :param extra_fields: Model fields the resolver needs besides the selected ones
+    :return: Optimized queryset
+    """
+    return QueryOptimizer(info).optimize(queryset, path, extra_fields)
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'debug_toolbar',
     'drf_yasg',
@@ -120,6 +121,9 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Seconds the user of a JWT is cached between requests, invalidated when the user is saved
+JWT_USER_CACHE_TIMEOUT = int(os.getenv('JWT_USER_CACHE_TIMEOUT', 60))
+
 GRAPHENE = {
     "SCHEMA": "jelly_backend.schema.schema"
 }
@@ -137,6 +141,57 @@ CELERY_TASK_SOFT_TIME_LIMIT = 300
 CELERY_TASK_ACKS_LATE = True
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 10
 
+# Identity card verification runs in its own queue, consumed by CPU-bound workers
+IDENTITY_VERIFICATION_QUEUE = 'identity_verification'
+# Product images are encoded and uploaded to Cloudinary after the product is created
+PRODUCT_IMAGE_QUEUE = 'product_images'
+CELERY_TASK_ROUTES = {
+    'validate_identity_verification_job': {'queue': IDENTITY_VERIFICATION_QUEUE},
+    'process_product_image': {'queue': PRODUCT_IMAGE_QUEUE},
+}
+IDENTITY_VERIFICATION_SPOOL_DIR = os.getenv('IDENTITY_VERIFICATION_SPOOL_DIR') or str(BASE_DIR / 'spool' / 'identity')
+IDENTITY_VERIFICATION_PUSH_ENABLED = os.getenv('IDENTITY_VERIFICATION_PUSH_ENABLED', 'False') == 'True'
+IDENTITY_VERIFICATION_CHECK_THREADS = int(os.getenv('IDENTITY_VERIFICATION_CHECK_THREADS', 3))
+IDENTITY_VERIFICATION_OCR_LANG = os.getenv('IDENTITY_VERIFICATION_OCR_LANG', 'spa')
+IDENTITY_VERIFICATION_RESULT_CACHE_TIMEOUT = int(os.getenv('IDENTITY_VERIFICATION_RESULT_CACHE_TIMEOUT', 600))
+# Seconds after which a started verification is considered lost and no longer blocks a new one
+IDENTITY_VERIFICATION_JOB_TIMEOUT = int(os.getenv('IDENTITY_VERIFICATION_JOB_TIMEOUT', CELERY_TASK_SOFT_TIME_LIMIT))
+# Same for pending verifications. They may wait behind a long queue, so only lost messages should reach it
+IDENTITY_VERIFICATION_QUEUE_TIMEOUT = int(os.getenv('IDENTITY_VERIFICATION_QUEUE_TIMEOUT', 24 * 60 * 60))
+# Workers of the verification queue load the models once, so they are not recycled every few tasks.
+# 0 disables recycling
+IDENTITY_VERIFICATION_MAX_TASKS_PER_CHILD = int(os.getenv('IDENTITY_VERIFICATION_MAX_TASKS_PER_CHILD', 0)) or None
+IDENTITY_VERIFICATION_WARM_UP = os.getenv('IDENTITY_VERIFICATION_WARM_UP', 'True') == 'True'
+# Only needed when verifications run in the web workers, e.g. with CELERY_TASK_ALWAYS_EAGER
+IDENTITY_VERIFICATION_WARM_UP_WEB = os.getenv('IDENTITY_VERIFICATION_WARM_UP_WEB', 'False') == 'True'
+
+PRODUCT_IMAGE_SPOOL_DIR = os.getenv('PRODUCT_IMAGE_SPOOL_DIR') or str(BASE_DIR / 'spool' / 'products')
+# Storage of the product images: products.storage.CloudinaryStorage, LocalStorage or MemoryStorage
+PRODUCT_IMAGE_STORAGE = os.getenv('PRODUCT_IMAGE_STORAGE') or 'products.storage.CloudinaryStorage'
+# Directory and URL of the images stored by LocalStorage
+PRODUCT_IMAGE_STORAGE_DIR = os.getenv('PRODUCT_IMAGE_STORAGE_DIR') or str(BASE_DIR / 'media' / 'products')
+PRODUCT_IMAGE_STORAGE_URL = os.getenv('PRODUCT_IMAGE_STORAGE_URL') or '/media/products/'
+# Quality of the full size image of products, versions and gallery images
+PRODUCT_IMAGE_QUALITY = int(os.getenv('PRODUCT_IMAGE_QUALITY', 85))
+# Resized copies uploaded with every image: long edge in pixels, format and quality. Images are never
+# upscaled. Formats the installed Pillow cannot encode (AVIF before Pillow 11.3) are delivered by the
+# storage when it can transform images (Cloudinary), and skipped otherwise
+PRODUCT_IMAGE_VARIANTS = {
+    'thumb': {'size': 160, 'format': 'WEBP', 'quality': 70},
+    'card': {'size': 480, 'format': 'WEBP', 'quality': 78},
+    'card_avif': {'size': 480, 'format': 'AVIF', 'quality': 55},
+    'detail': {'size': 1200, 'format': 'WEBP', 'quality': 82},
+    'detail_avif': {'size': 1200, 'format': 'AVIF', 'quality': 60},
+}
+# Long edge in pixels of the placeholder stored on the model as a data URI
+PRODUCT_IMAGE_PLACEHOLDER_SIZE = 16
+# Threads of each image worker storing an image and its variants concurrently
+PRODUCT_IMAGE_UPLOAD_THREADS = int(os.getenv('PRODUCT_IMAGE_UPLOAD_THREADS', 4))
+# Retries of a failed image processing, with exponential backoff, before the image is marked as failed
+PRODUCT_IMAGE_MAX_RETRIES = int(os.getenv('PRODUCT_IMAGE_MAX_RETRIES', 3))
+# Maximum number of images uploaded in a single gallery upload request
+PRODUCT_IMAGE_BATCH_MAX_FILES = int(os.getenv('PRODUCT_IMAGE_BATCH_MAX_FILES', 20))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -176,6 +231,67 @@ CACHES = {
     }
 }
 
+# Catalog totals (totalProducts, totalGroups, totalCategories)
+CATALOG_COUNT_CACHE_TIMEOUT = int(os.getenv('CATALOG_COUNT_CACHE_TIMEOUT', 300))
+CATALOG_APPROXIMATE_COUNTS = os.getenv('CATALOG_APPROXIMATE_COUNTS', 'False') == 'True'
+CATALOG_APPROXIMATE_COUNT_THRESHOLD = int(os.getenv('CATALOG_APPROXIMATE_COUNT_THRESHOLD', 100000))
+
+# GraphQL response cache. Only operations whose root fields are all listed here are cached, because
+# these are the fields invalidated by the catalog and banner phrase signals.
+GRAPHQL_RESPONSE_CACHE_ENABLED = os.getenv('GRAPHQL_RESPONSE_CACHE_ENABLED', 'True') == 'True'
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = int(os.getenv('GRAPHQL_RESPONSE_CACHE_TIMEOUT', 600))
+GRAPHQL_RESPONSE_CACHE_FIELDS = [
+    'listProducts',
+    'listProductsWithoutPagination',
+    'productsConnection',
+    'getProduct',
+    'totalProducts',
+    'bannerPhrases',
+]
+
+# Automatic persisted queries and HTTP caching of anonymous GET requests to /graphql
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = int(os.getenv('GRAPHQL_PERSISTED_QUERY_TIMEOUT', 60 * 60 * 24 * 7))
+GRAPHQL_HTTP_CACHE_MAX_AGE = int(os.getenv('GRAPHQL_HTTP_CACHE_MAX_AGE', 30))
+
+# Page size of the keyset connections (first), when not given and at most
+GRAPHQL_DEFAULT_PAGE_SIZE = 20
+GRAPHQL_MAX_PAGE_SIZE = 100
+
+# GraphQL query cost limits. Object fields cost 1 and leaf fields 0 unless overridden in
+# GRAPHQL_FIELD_COSTS ('TypeName.fieldName'). List fields cost 1 per item plus the cost of the
+# selection of each item, for pageSize items when page is given too, first items (capped like the
+# connections), or their estimated size when they are not paginated.
+GRAPHQL_MAX_QUERY_COST = int(os.getenv('GRAPHQL_MAX_QUERY_COST', 2000))
+GRAPHQL_MAX_QUERY_DEPTH = int(os.getenv('GRAPHQL_MAX_QUERY_DEPTH', 8))
+GRAPHQL_DEFAULT_LIST_SIZE = 100
+GRAPHQL_LIST_SIZE_ESTIMATES = {
+    'ProductType.images': 10,
+    'ProductType.productVersion': 10,
+    'Query.listProductsWithoutPagination': 500,
+    'Query.listGroupsWithoutPagination': 200,
+    'Query.listCategoriesWithoutPagination': 200,
+    # The paginated lists return the whole table when page or pageSize is missing
+    'Query.listProducts': 500,
+    'Query.listGroups': 200,
+    'Query.listCategories': 200,
+    'Query.bannerPhrases': 10,
+    'ProductType.imageVariants': len(PRODUCT_IMAGE_VARIANTS),
+    'VersionType.imageVariants': len(PRODUCT_IMAGE_VARIANTS),
+    'ProductImageFileType.imageVariants': len(PRODUCT_IMAGE_VARIANTS),
+}
+GRAPHQL_FIELD_COSTS = {
+    'Query.totalProducts': 1,
+    'Query.totalGroups': 1,
+    'Query.totalCategories': 1,
+    # Read from the row of the image, without any query
+    'ProductType.imageVariants': 0,
+    'VersionType.imageVariants': 0,
+    'ProductImageFileType.imageVariants': 0,
+}
+
+# Rows fetched per round-trip when streaming whole catalog tables
+CATALOG_EXPORT_CHUNK_SIZE = int(os.getenv('CATALOG_EXPORT_CHUNK_SIZE', 2000))
+
 CORS_ALLOW_HEADERS = [
     'Content-Type',
     'Accept',
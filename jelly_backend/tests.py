@@ -0,0 +1,319 @@
+import hashlib
+import json
+from unittest import mock
+
+from celery import Celery
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from graphql import get_operation_ast, parse
+
+from jelly_backend import graphql_documents
+from jelly_backend.celery import celery as celery_module
+from jelly_backend.decorators import get_jwt_user, jwt_user_cache_key
+from jelly_backend.graphql_documents import PersistedQueryError, get_persisted_query_hash, validate_document
+from jelly_backend.query_cost import QueryCostAnalyzer, QueryCostError, check_query_cost
+from jelly_backend.query_optimizer import optimize_queryset
+from jelly_backend.schema import schema
+from products.models import Category, Group, Product
+from users.models import User
+
+
+def query_cost(query: str, variables: dict = None) -> int:
+    document = parse(query)
+    cost, _ = QueryCostAnalyzer(schema.graphql_schema, document, variables).analyze(
+        get_operation_ast(document)
+    )
+    return cost
+
+
+@override_settings(GRAPHQL_DEFAULT_LIST_SIZE=100)
+class QueryCostAnalyzerTests(SimpleTestCase):
+
+    def test_list_of_leaf_fields_costs_each_item(self):
+        self.assertEqual(query_cost('{ listProducts(page: 1, pageSize: 50) { name description } }'), 1 + 50)
+
+    def test_huge_page_size_is_priced_by_its_size(self):
+        self.assertEqual(query_cost('{ listProducts(page: 1, pageSize: 1000000) { name } }'), 1 + 1000000)
+
+    def test_page_size_from_variables(self):
+        query = 'query ($size: Int) { listProducts(page: 1, pageSize: $size) { name } }'
+        self.assertEqual(query_cost(query, {'size': 30}), 1 + 30)
+
+    def test_page_size_without_page_is_priced_as_the_whole_list(self):
+        # The resolvers return every row unless both page and pageSize are given
+        with self.settings(GRAPHQL_LIST_SIZE_ESTIMATES={'Query.listProducts': 500}):
+            self.assertEqual(query_cost('{ listProducts(pageSize: 1) { id } }'), 1 + 500)
+            query = 'query ($page: Int) { listProducts(page: $page, pageSize: 1) { id } }'
+            self.assertEqual(query_cost(query, {'page': None}), 1 + 500)
+            self.assertEqual(query_cost(query, {'page': 3}), 1 + 1)
+
+    def test_unpaginated_list_uses_its_estimate(self):
+        with self.settings(GRAPHQL_LIST_SIZE_ESTIMATES={'Query.listProductsWithoutPagination': 500}):
+            self.assertEqual(query_cost('{ listProductsWithoutPagination { name } }'), 1 + 500)
+
+    def test_unpaginated_list_without_estimate_uses_the_default_size(self):
+        with self.settings(GRAPHQL_LIST_SIZE_ESTIMATES={}):
+            self.assertEqual(query_cost('{ listProducts { name } }'), 1 + 100)
+
+    def test_nested_lists_multiply(self):
+        with self.settings(GRAPHQL_LIST_SIZE_ESTIMATES={'ProductType.images': 10}):
+            cost = query_cost('{ listProducts(page: 1, pageSize: 20) { name images { id } } }')
+        self.assertEqual(cost, 1 + 20 * (1 + 1 + 10))
+
+    def test_connection_first_is_capped_like_the_pagination(self):
+        query = '{ productsConnection(first: %d) { edges { node { name } } } }'
+        # connection + edges list of the page size, each edge with its node
+        self.assertEqual(query_cost(query % 100000), 1 + 1 + settings.GRAPHQL_MAX_PAGE_SIZE * (1 + 1))
+        self.assertEqual(query_cost(query % 10), 1 + 1 + 10 * (1 + 1))
+
+    def test_connection_without_first_uses_the_default_page_size(self):
+        cost = query_cost('{ productsConnection { edges { node { name } } } }')
+        self.assertEqual(cost, 1 + 1 + settings.GRAPHQL_DEFAULT_PAGE_SIZE * (1 + 1))
+
+    def test_leaf_fields_and_introspection_are_free(self):
+        self.assertEqual(query_cost('{ totalProducts __typename }'), 1)
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=1000, GRAPHQL_MAX_QUERY_DEPTH=8)
+    def test_check_query_cost_rejects_expensive_operations(self):
+        document = parse('{ listProducts(page: 1, pageSize: 1000000) { name } }')
+        with self.assertRaises(QueryCostError) as context:
+            check_query_cost(schema.graphql_schema, document, get_operation_ast(document))
+        self.assertEqual(context.exception.report['requested'], 1 + 1000000)
+        self.assertEqual(context.exception.extensions['code'], 'QUERY_TOO_EXPENSIVE')
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=1000, GRAPHQL_MAX_QUERY_DEPTH=8)
+    def test_check_query_cost_accepts_a_capped_connection(self):
+        document = parse('{ productsConnection(first: 100000) { edges { node { name } } } }')
+        report = check_query_cost(schema.graphql_schema, document, get_operation_ast(document))
+        self.assertEqual(report['requested'], 2 + settings.GRAPHQL_MAX_PAGE_SIZE * 2)
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=100000, GRAPHQL_MAX_QUERY_DEPTH=3)
+    def test_check_query_cost_rejects_deep_operations(self):
+        document = parse('{ productsConnection { edges { node { images { id } } } } }')
+        with self.assertRaises(QueryCostError):
+            check_query_cost(schema.graphql_schema, document, get_operation_ast(document))
+
+
+class PersistedQueryHashTests(SimpleTestCase):
+    query_hash = hashlib.sha256(b'{ totalProducts }').hexdigest()
+
+    def get_hash(self, extensions):
+        return get_persisted_query_hash(RequestFactory().post('/graphql'), {'extensions': extensions})
+
+    def test_reads_the_hash(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': self.query_hash}}
+        self.assertEqual(self.get_hash(extensions), self.query_hash)
+
+    def test_reads_the_hash_of_get_requests(self):
+        extensions = json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': self.query_hash}})
+        request = RequestFactory().get('/graphql', {'extensions': extensions})
+        self.assertEqual(get_persisted_query_hash(request, {}), self.query_hash)
+
+    def test_requests_without_persisted_query(self):
+        self.assertIsNone(self.get_hash(None))
+        self.assertIsNone(self.get_hash({}))
+        self.assertIsNone(self.get_hash('not json'))
+
+    def test_rejects_invalid_persisted_queries(self):
+        invalid = [
+            'abc',
+            ['hash'],
+            {'version': 1},
+            {'sha256Hash': 123},
+            {'sha256Hash': 'abc'},
+            {'sha256Hash': self.query_hash.upper()},
+            {'sha256Hash': self.query_hash + '\n'},
+            {'sha256Hash': 'g' * 64},
+        ]
+        for persisted_query in invalid:
+            with self.subTest(persisted_query=persisted_query):
+                with self.assertRaises(PersistedQueryError) as context:
+                    self.get_hash({'persistedQuery': persisted_query})
+                self.assertEqual(context.exception.code, 'INVALID_PERSISTED_QUERY')
+
+
+class PersistedQueryViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, body: dict):
+        return self.client.post('/graphql', json.dumps(body), content_type='application/json')
+
+    def test_invalid_persisted_query_returns_a_graphql_error(self):
+        response = self.post({'extensions': {'persistedQuery': 'abc'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'INVALID_PERSISTED_QUERY')
+
+    def test_unknown_hash_asks_for_the_query(self):
+        query_hash = hashlib.sha256(b'{ totalProducts }').hexdigest()
+        response = self.post({'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash}}})
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+
+class GraphQLViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        validate_document.cache_clear()
+
+    def post(self, query: str):
+        return self.client.post('/graphql', json.dumps({'query': query}), content_type='application/json')
+
+    def test_cost_is_reported_in_the_extensions(self):
+        response = self.post('{ listProducts(page: 1, pageSize: 5) { name } }')
+        self.assertEqual(response.json()['extensions']['cost']['requested'], 1 + 5)
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=1000)
+    def test_expensive_operation_is_not_executed(self):
+        with self.assertNumQueries(0):
+            response = self.post('{ listProducts(page: 1, pageSize: 1000000) { name } }')
+
+        body = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('data', body)
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'QUERY_TOO_EXPENSIVE')
+        self.assertEqual(body['extensions']['cost']['requested'], 1 + 1000000)
+
+    def test_validation_is_memoized_per_query(self):
+        with mock.patch('jelly_backend.graphql_documents.validate', wraps=graphql_documents.validate) as validate:
+            for _ in range(2):
+                response = self.post('{ listProducts { unknownField } }')
+                self.assertIn("Cannot query field 'unknownField'", response.json()['errors'][0]['message'])
+
+        self.assertEqual(validate.call_count, 1)
+
+
+class JwtUserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='admin@jelly.cl', first_name='Ana', last_name='Pérez', password='secreto123', user_admin=True
+        )
+
+    def test_cached_user_is_used_without_queries(self):
+        get_jwt_user(self.user.id)
+        with self.assertNumQueries(0):
+            user = get_jwt_user(self.user.id)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_authenticated)
+        self.assertTrue(user.user_admin)
+
+    def test_only_the_permission_fields_are_cached(self):
+        get_jwt_user(self.user.id)
+        cached = cache.get(jwt_user_cache_key(self.user.id))
+
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, str(cached))
+        self.assertIn('password', get_jwt_user(self.user.id).get_deferred_fields())
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        self.assertTrue(get_jwt_user(self.user.id).user_admin)
+
+        self.user.user_admin = False
+        self.user.save()
+
+        self.assertIsNone(cache.get(jwt_user_cache_key(self.user.id)))
+        self.assertFalse(get_jwt_user(self.user.id).user_admin)
+
+    def test_deleted_user_is_anonymous(self):
+        get_jwt_user(self.user.id)
+        user_id = self.user.id
+        self.user.delete()
+
+        self.assertFalse(get_jwt_user(user_id).is_authenticated)
+
+
+class QueryOptimizerTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Álbumes')
+        group = Group.objects.create(name='BTS')
+        for name in ('Be', 'Butter'):
+            Product.objects.create(name=name, category=category, group=group)
+
+    def execute(self, query: str):
+        # Keeps the querysets built by the product resolvers
+        querysets = []
+
+        def record(*args, **kwargs):
+            querysets.append(optimize_queryset(*args, **kwargs))
+            return querysets[-1]
+
+        with mock.patch('products.schema.optimize_queryset', side_effect=record):
+            result = schema.execute(query, context_value=RequestFactory().get('/graphql'))
+        self.assertIsNone(result.errors)
+        return result.data, querysets[0]
+
+    def assertOnly(self, queryset, fields: set):
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(fields), False))
+
+    def test_only_selected_columns_are_loaded(self):
+        _, queryset = self.execute('{ listProducts(page: 1, pageSize: 5) { name price } }')
+
+        self.assertOnly(queryset, {'id', 'name', 'price'})
+        self.assertFalse(queryset.query.select_related)
+
+    def test_foreign_keys_are_joined(self):
+        with self.assertNumQueries(1):
+            data, queryset = self.execute('{ listProducts(page: 1, pageSize: 5) { name group { name } } }')
+
+        self.assertOnly(queryset, {'id', 'name', 'group', 'group__id', 'group__name'})
+        self.assertEqual(queryset.query.select_related, {'group': {}})
+        self.assertEqual(data['listProducts'][0], {'name': 'Be', 'group': {'name': 'BTS'}})
+
+    def test_fragments_and_resolver_dependencies(self):
+        _, queryset = self.execute("""
+            { listProducts(page: 1, pageSize: 5) { ...productFields ... on ProductType { images { id } } } }
+            fragment productFields on ProductType { stock category { id } }
+        """)
+
+        self.assertOnly(queryset, {'id', 'stock', 'category', 'category__id'})
+        self.assertEqual(queryset.query.select_related, {'category': {}})
+
+    def test_connection_nodes_are_optimized(self):
+        _, queryset = self.execute('{ productsConnection(first: 5) { edges { node { stock } } } }')
+
+        # The name is the keyset pagination column
+        self.assertOnly(queryset, {'id', 'stock', 'name'})
+
+
+class CeleryWorkerConfigurationTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(celery_module, 'identity_verification_worker', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A new app configured like the project one, so the real configuration is not changed
+        self.app = Celery('jelly_backend_tests')
+        self.app.config_from_object('django.conf:settings', namespace='CELERY')
+
+    def start_worker(self, queues):
+        celery_module.configure_identity_verification_worker(conf=self.app.conf, options={'queues': queues})
+        with mock.patch('users.verification_service.warm_up_identity_verification') as warm_up:
+            celery_module.warm_up_worker_process()
+        return warm_up
+
+    @override_settings(IDENTITY_VERIFICATION_MAX_TASKS_PER_CHILD=None, IDENTITY_VERIFICATION_WARM_UP=True)
+    def test_identity_verification_worker_keeps_its_processes(self):
+        warm_up = self.start_worker('product_images,identity_verification')
+
+        self.assertIsNone(self.app.conf.worker_max_tasks_per_child)
+        self.assertEqual(self.app.conf.worker_proc_alive_timeout, celery_module.IDENTITY_VERIFICATION_WARM_UP_TIMEOUT)
+        warm_up.assert_called_once_with()
+
+    @override_settings(IDENTITY_VERIFICATION_MAX_TASKS_PER_CHILD=500, IDENTITY_VERIFICATION_WARM_UP=False)
+    def test_warm_up_can_be_disabled(self):
+        warm_up = self.start_worker(['identity_verification'])
+
+        self.assertEqual(self.app.conf.worker_max_tasks_per_child, 500)
+        warm_up.assert_not_called()
+
+    def test_other_workers_keep_the_global_configuration(self):
+        warm_up = self.start_worker(['celery', 'product_images'])
+
+        self.assertEqual(self.app.conf.worker_max_tasks_per_child, settings.CELERY_WORKER_MAX_TASKS_PER_CHILD)
+        warm_up.assert_not_called()
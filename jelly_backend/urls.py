@@ -7,11 +7,11 @@ import debug_toolbar
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 
-from graphene_django.views import GraphQLView
 
 from rest_framework.permissions import AllowAny
 
 from jelly_backend import settings
+from jelly_backend.views import JellyGraphQLView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -47,10 +47,10 @@ if settings.DEBUG:
         re_path(r"^swagger/$", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
         path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
         # GraphQL
-        path('graphql', ensure_csrf_cookie(GraphQLView.as_view(graphiql=True))),
+        path('graphql', ensure_csrf_cookie(JellyGraphQLView.as_view(graphiql=True))),
     ]
 
 else:
     urlpatterns += [
-        path('graphql', ensure_csrf_cookie(GraphQLView.as_view(graphiql=False))),
+        path('graphql', ensure_csrf_cookie(JellyGraphQLView.as_view(graphiql=False))),
     ]
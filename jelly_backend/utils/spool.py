@@ -0,0 +1,36 @@
+import os
+from pathlib import Path
+
+
+def spool_upload(uploaded_file, directory, name: str) -> str:
+    """
+    Writes an uploaded file to a local spool directory shared by the web and Celery workers.
+    :param uploaded_file: Django UploadedFile (or any object with chunks() or read())
+    :param directory: Spool directory
+    :param name: File name inside the directory
+    :return: Absolute path of the spooled file
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+
+    with open(path, 'wb') as destination:
+        if hasattr(uploaded_file, 'chunks'):
+            for chunk in uploaded_file.chunks():
+                destination.write(chunk)
+        else:
+            destination.write(uploaded_file.read())
+    return str(path)
+
+
+def read_spooled(path: str) -> bytes:
+    with open(path, 'rb') as spooled_file:
+        return spooled_file.read()
+
+
+def discard_spooled(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,125 @@
+from django.conf import settings
+from graphene_django.views import GraphQLView
+from graphql import ExecutionContext
+
+from jelly_backend.graphql_cache import get_cached_response, get_response_cache_key, set_cached_response
+from jelly_backend.query_cost import QueryCostError, check_query_cost
+from jelly_backend.graphql_documents import (
+    MemoizedValidationRule,
+    PersistedQueryError,
+    get_persisted_query_hash,
+    resolve_persisted_query,
+)
+
+
+class CostCheckedExecutionContext(ExecutionContext):
+    """
+    Execution context that prices the operation with QueryCostAnalyzer before running any resolver.
+    The cost is stored on the request, which is the context value of the view.
+    """
+    @classmethod
+    def build(cls, schema, document, root_value=None, context_value=None, raw_variable_values=None, *args, **kwargs):
+        context = super().build(schema, document, root_value, context_value, raw_variable_values, *args, **kwargs)
+        if isinstance(context, list):
+            return context
+
+        try:
+            context_value.graphql_query_cost = check_query_cost(
+                schema, document, context.operation, raw_variable_values
+            )
+        except QueryCostError as e:
+            context_value.graphql_query_cost = e.report
+            return [e]
+        return context
+
+
+class JellyGraphQLView(GraphQLView):
+    """
+    GraphQL view used by the project.
+
+    Each request gets its own set of dataloaders, so batched results never leak between requests.
+    Responses of public catalog queries are served from the cache until a catalog model changes.
+
+    Operations are priced by QueryCostAnalyzer before execution and rejected when they exceed the
+    configured budget. The computed cost is reported in the ``extensions`` of the response. The
+    validation of each query text is memoized per process.
+
+    Clients can send automatic persisted queries (Apollo protocol): GET requests carrying only the
+    sha256 hash of the query and its variables. Anonymous GET responses are marked as publicly
+    cacheable, so nginx can serve them without reaching Django.
+    """
+    execution_context_class = CostCheckedExecutionContext
+    validation_rules = (MemoizedValidationRule,)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+
+        if getattr(request, 'graphql_http_cacheable', False):
+            response['Cache-Control'] = f'public, max-age={settings.GRAPHQL_HTTP_CACHE_MAX_AGE}'
+        return response
+
+    @staticmethod
+    def mark_http_cacheable(request) -> None:
+        """
+        Marks an anonymous GET response as cacheable by shared caches such as nginx.
+        :param request: Django request
+        :return: None
+        """
+        if request.method != 'GET' or 'access_token' in request.COOKIES:
+            return
+        request.graphql_http_cacheable = True
+        # A shared cache must never store a CSRF cookie, POST responses still set it
+        request.META['CSRF_COOKIE_NEEDS_UPDATE'] = False
+
+    def json_encode(self, request, d, pretty=False):
+        cost = getattr(request, 'graphql_query_cost', None)
+        if cost is not None and isinstance(d, dict):
+            d = dict(d, extensions={'cost': cost})
+        return super().json_encode(request, d, pretty)
+
+    def get_context(self, request):
+        request.dataloaders = {}
+        return request
+
+    def get_response(self, request, data, show_graphiql=False):
+        if show_graphiql:
+            return super().get_response(request, data, show_graphiql)
+
+        try:
+            query_hash = get_persisted_query_hash(request, data)
+            if query_hash:
+                query = resolve_persisted_query(query_hash, request.GET.get('query') or data.get('query'))
+                data = dict(data.dict() if hasattr(data, 'dict') else data, query=query)
+        except PersistedQueryError as e:
+            errors = [{'message': e.message, 'extensions': {'code': e.code}}]
+            return self.json_encode(request, {'errors': errors}), 200
+
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        cache_key = get_response_cache_key(request, query, variables, operation_name)
+        if cache_key:
+            cached_response = get_cached_response(cache_key)
+            if cached_response is not None:
+                self.mark_http_cacheable(request)
+                return cached_response, 200
+
+        result, status_code = super().get_response(request, data, show_graphiql)
+
+        if cache_key and status_code == 200 and getattr(request, 'graphql_cacheable', False):
+            set_cached_response(cache_key, result)
+            self.mark_http_cacheable(request)
+        return result, status_code
+
+    @staticmethod
+    def get_graphql_params(request, data):
+        query, variables, operation_name, id = GraphQLView.get_graphql_params(request, data)
+        # Persisted queries are resolved into the body, so they win over the GET parameter
+        if data.get('query'):
+            query = data.get('query')
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        execution_result = super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        request.graphql_cacheable = execution_result is not None and not execution_result.errors
+        return execution_result
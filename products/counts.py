@@ -0,0 +1,65 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from jelly_backend.cache_versions import get_cache_version
+from products.search import normalize_search_text
+
+# Namespaces searched with search_products, which ignores case and accents. The others are filtered
+# with name__icontains, so "Álbum" and "album" are different searches
+NORMALIZED_SEARCH_NAMESPACES = ('product',)
+
+
+def approximate_count(model) -> int | None:
+    """
+    Reads the planner's row estimate of a table instead of counting it.
+    :param model: Model whose table is estimated
+    :return: Estimated number of rows, or None if the database cannot estimate it
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [model._meta.db_table])
+        row = cursor.fetchone()
+    if not row or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def cached_count(queryset, namespace: str, search: str = None) -> int:
+    """
+    Counts a catalog queryset, caching the result until the namespace version changes.
+
+    The cache key contains the search term, normalized in NORMALIZED_SEARCH_NAMESPACES so that
+    equivalent searches like "Álbum " and "album" share an entry.
+    With CATALOG_APPROXIMATE_COUNTS enabled, unfiltered totals of large tables come from the
+    planner's estimate instead of a COUNT(*).
+
+    :param queryset: Queryset already filtered by the search term
+    :param namespace: Version namespace invalidated when the model changes (e.g. 'product')
+    :param search: Search term used to filter the queryset
+    :return: Number of rows
+    """
+    term = search or ''
+    if namespace in NORMALIZED_SEARCH_NAMESPACES:
+        term = normalize_search_text(term)
+    term_hash = hashlib.sha1(term.encode()).hexdigest()
+    version = get_cache_version(namespace)
+    cache_key = f'catalog_count_{namespace}_{version}_{term_hash}'
+
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+
+    count = None
+    if not term and settings.CATALOG_APPROXIMATE_COUNTS:
+        estimate = approximate_count(queryset.model)
+        if estimate is not None and estimate >= settings.CATALOG_APPROXIMATE_COUNT_THRESHOLD:
+            count = estimate
+    if count is None:
+        count = queryset.count()
+
+    cache.set(cache_key, count, timeout=settings.CATALOG_COUNT_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,184 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.db import transaction
+
+from jelly_backend.graphql_cache import invalidate_graphql_cache
+from jelly_backend.utils.spool import discard_spooled, read_spooled, spool_upload
+from products.models import Product, ProductImageFile, StoredImage, Version
+from products.utils import ImageDecodeError, upload_product_image
+
+# Storage folder of the images of each model
+IMAGE_FOLDERS = {
+    'product': 'Products',
+    'version': 'Products/ProductsVersions',
+    'productimagefile': 'Products/ProductsImages',
+}
+
+IMAGE_FIELDS = ['image', 'image_status', 'image_variants', 'image_placeholder']
+
+IMAGE_MODELS = {model._meta.model_name: model for model in (Product, Version, ProductImageFile)}
+
+
+def non_image_fields(model) -> list:
+    """
+    Returns the fields of a model to save when editing an instance outside of the image task. Saving the
+    image fields loaded before the task finished would reset the processed image to pending.
+    :param model: Product, Version or ProductImageFile
+    :return: List of field names for update_fields
+    """
+    return [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in IMAGE_FIELDS
+    ]
+
+
+def spooled_image_path(model_name: str, object_id) -> str:
+    return os.path.join(settings.PRODUCT_IMAGE_SPOOL_DIR, f'{model_name}_{object_id}')
+
+
+def file_digest(image_file) -> str:
+    """
+    Returns the sha256 of an uploaded file, the key of the deduplication index.
+    :param image_file: Django UploadedFile
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    for chunk in image_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_with_image(model, image_file, **fields):
+    """
+    Creates a product, version or gallery image with an uploaded image.
+
+    If the same bytes were already uploaded, the stored image and its variants are reused and the
+    instance is created ready. Otherwise it is created pending and its image is processed by a task.
+
+    :param model: Product, Version or ProductImageFile
+    :param image_file: Uploaded image
+    :param fields: Rest of the fields of the instance
+    :return: The created instance
+    """
+    digest = file_digest(image_file)
+    stored_image = StoredImage.objects.filter(digest=digest).first()
+    if stored_image is not None:
+        return model.objects.create(**fields, **stored_image.get_image_fields())
+
+    instance = model.objects.create(**fields, image_status='P')
+    enqueue_image_upload(instance, image_file, digest)
+    return instance
+
+
+def create_product_images(product, image_files: list) -> list:
+    """
+    Creates the gallery images of a product from many uploaded images, with a single INSERT.
+    Images already stored are reused, the rest are processed by one task each.
+    :param product: Product
+    :param image_files: List of uploaded images
+    :return: List of the created ProductImageFile, in the order of the images
+    """
+    digests = [file_digest(image_file) for image_file in image_files]
+    stored_images = StoredImage.objects.in_bulk(digests, field_name='digest')
+
+    product_images = []
+    for digest in digests:
+        stored_image = stored_images.get(digest)
+        image_fields = stored_image.get_image_fields() if stored_image else {'image_status': 'P'}
+        product_images.append(ProductImageFile(product=product, **image_fields))
+    ProductImageFile.objects.bulk_create(product_images)
+    # bulk_create does not send post_save, which invalidates the cached catalog responses
+    invalidate_graphql_cache()
+
+    for product_image, image_file, digest in zip(product_images, image_files, digests):
+        if product_image.image_status == 'P':
+            enqueue_image_upload(product_image, image_file, digest)
+    return product_images
+
+
+def enqueue_image_upload(instance, image_file, digest: str = None) -> None:
+    """
+    Spools the uploaded image of a product, version or gallery image and enqueues its processing.
+    The instance must be saved with image_status 'P', the task stores the URL once the image is uploaded.
+    :param instance: Product, Version or ProductImageFile
+    :param image_file: Uploaded image
+    :param digest: sha256 of the image, computed by the task when not given
+    :return: None
+    """
+    from products.tasks import process_product_image
+
+    model_name = instance._meta.model_name
+    spool_upload(image_file, settings.PRODUCT_IMAGE_SPOOL_DIR, f'{model_name}_{instance.pk}')
+    transaction.on_commit(
+        lambda: process_product_image.delay(model_name=model_name, object_id=str(instance.pk), digest=digest)
+    )
+
+
+def store_image(content: bytes, folder: str, digest: str) -> StoredImage:
+    """
+    Returns the stored image of some image bytes, processing and storing the image if they are new.
+    :param content: Bytes of the uploaded image
+    :param folder: Storage folder used if the image is new
+    :param digest: sha256 of the bytes
+    :return: StoredImage
+    """
+    stored_image = StoredImage.objects.filter(digest=digest).first()
+    if stored_image is not None:
+        return stored_image
+
+    uploaded = upload_product_image(image_file=BytesIO(content), folder=folder)
+    # Another worker may have stored the same bytes meanwhile, the first one is kept in the index
+    stored_image, _ = StoredImage.objects.get_or_create(
+        digest=digest,
+        defaults={
+            'image': uploaded['image'],
+            'image_variants': uploaded['variants'],
+            'image_placeholder': uploaded['placeholder'],
+        },
+    )
+    return stored_image
+
+
+def run_product_image_job(model_name: str, object_id: str, digest: str = None, last_attempt: bool = True) -> None:
+    """
+    Encodes and uploads the spooled image of a product, version or gallery image, with its variants,
+    and stores their URLs and the placeholder. Images already stored are reused.
+
+    When an attempt fails before the last one, the instance stays pending and the spooled image is
+    kept for the retry, unless the image cannot be decoded.
+
+    :param model_name: Name of the model of the instance, e.g. 'product'
+    :param object_id: ID of the instance
+    :param digest: sha256 of the image, computed from the spooled file when not given
+    :param last_attempt: Whether a failure marks the image as failed instead of being retried
+    :return: None
+    """
+    model = IMAGE_MODELS[model_name]
+    path = spooled_image_path(model_name, object_id)
+    try:
+        instance = model.objects.get(id=object_id)
+    except model.DoesNotExist:
+        discard_spooled(path)
+        return
+    if instance.image_status != 'P':
+        discard_spooled(path)
+        return
+
+    try:
+        content = read_spooled(path)
+        stored_image = store_image(content, IMAGE_FOLDERS[model_name], digest or hashlib.sha256(content).hexdigest())
+    except Exception as e:
+        if last_attempt or isinstance(e, ImageDecodeError):
+            instance.image_status = 'E'
+            instance.save(update_fields=['image_status'])
+            discard_spooled(path)
+        raise
+
+    for field, value in stored_image.get_image_fields().items():
+        setattr(instance, field, value)
+    # Only the image fields are saved, so concurrent edits of the instance are kept
+    instance.save(update_fields=IMAGE_FIELDS)
+    discard_spooled(path)
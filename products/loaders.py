@@ -0,0 +1,24 @@
+from jelly_backend.dataloaders import RelatedListLoader, get_dataloader
+from products.models import ProductImageFile, Version
+
+
+def product_images_loader(info) -> RelatedListLoader:
+    return get_dataloader(info, 'product_images', lambda: RelatedListLoader(ProductImageFile, 'product'))
+
+
+def product_versions_loader(info) -> RelatedListLoader:
+    return get_dataloader(info, 'product_versions', lambda: RelatedListLoader(Version, 'product'))
+
+
+def prime_product_loaders(info, products) -> list:
+    """
+    Primes the related-list loaders of ProductType with the given products.
+    :param info: GraphQL resolve info
+    :param products: Iterable of products that are going to be resolved
+    :return: The products as a list
+    """
+    products = list(products)
+    keys = [product.pk for product in products]
+    product_images_loader(info).prime(keys)
+    product_versions_loader(info).prime(keys)
+    return products
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Ready'), ('E', 'Error')], default='R', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='productimagefile',
+            name='image_status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Ready'), ('E', 'Error')], default='R', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='version',
+            name='image_status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Ready'), ('E', 'Error')], default='R', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='productimagefile',
+            name='image',
+            field=models.URLField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:02
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('image', models.URLField(db_index=True)),
+                ('image_variants', models.JSONField(blank=True, default=dict)),
+                ('image_placeholder', models.TextField(blank=True, default=None, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'stored_image',
+            },
+        ),
+    ]
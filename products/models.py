@@ -2,6 +2,13 @@ import uuid
 
 from django.db import models
 
+# State of the image of a product, version or gallery image, processed by a Celery task after upload
+IMAGE_STATUS_CHOICES = (
+    ('P', 'Pending'),
+    ('R', 'Ready'),
+    ('E', 'Error'),
+)
+
 
 class BaseEntity(models.Model):
     """
@@ -27,6 +34,9 @@ class Group(BaseEntity):
 
     class Meta:
         db_table = "group"
+        indexes = [
+            models.Index(fields=['name', 'id'], name='group_name_id_idx'),
+        ]
 
 
 class Category(BaseEntity):
@@ -39,9 +49,35 @@ class Category(BaseEntity):
 
     class Meta:
         db_table = "category"
+        indexes = [
+            models.Index(fields=['name', 'id'], name='category_name_id_idx'),
+        ]
+
+
+class BaseImage(models.Model):
+    """
+    Base model for Product, Version and ProductImageFile
 
+    This model contains the attributes of an uploaded image, set by a Celery task once the image is processed.
 
-class BaseProduct(models.Model):
+    Attributes:
+        - image: URL of the image at full size
+        - image_status: Whether the uploaded image is still being processed (Pending), is available in
+          ``image`` (Ready) or could not be processed (Error)
+        - image_variants: Resized copies of the image by name (see PRODUCT_IMAGE_VARIANTS), each one with
+          its url, width, height and format
+        - image_placeholder: Tiny version of the image as a data URI, shown blurred while the image loads
+    """
+    image = models.URLField(default=None, blank=True, null=True)
+    image_status = models.CharField(max_length=1, choices=IMAGE_STATUS_CHOICES, default='R', blank=False, null=False)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_placeholder = models.TextField(default=None, blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class BaseProduct(BaseImage):
     """
     Base model for Product and Version
 
@@ -50,7 +86,6 @@ class BaseProduct(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, blank=False, null=False, editable=False)
     name = models.CharField(max_length=100)
     stock = models.IntegerField(default=0, blank=True, null=True)
-    image = models.URLField(default=None, blank=True, null=True)
     is_disabled = models.BooleanField(default=False, blank=True, null=True)
 
     class Meta:
@@ -66,15 +101,20 @@ class Product(BaseProduct):
 
     Attributes:
         - is_disabled: BooleanField to indicate if the product is sold out or not
+        - search_document: Normalized name and description, indexed with trigrams for searching
     """
     description = models.TextField(blank=True, null=True)
     price = models.IntegerField(default=0, blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     group = models.ForeignKey(Group, on_delete=models.PROTECT)
     discount_price = models.IntegerField(blank=True, null=True, default=None)
+    search_document = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         db_table = "product"
+        indexes = [
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ]
 
 
 class Version(BaseProduct):
@@ -90,15 +130,46 @@ class Version(BaseProduct):
         db_table = "version"
 
 
-class ProductImageFile(models.Model):
+class ProductImageFile(BaseImage):
     """
     ProductImageFile model
 
-    This model represents images of a product
+    This model represents images of a product. ``image`` is empty until the uploaded file is processed,
+    see ``image_status``.
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, blank=False, null=False, editable=False)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
-    image = models.URLField()
 
     class Meta:
         db_table = "product_image_file"
+
+
+class StoredImage(models.Model):
+    """
+    StoredImage model
+
+    This model is the deduplication index of the uploaded images: the stored image, variants and placeholder
+    of each image content, by the sha256 of its bytes. Uploading the same bytes again for any product, version
+    or gallery image reuses them instead of processing and storing the image again.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, blank=False, null=False, editable=False)
+    digest = models.CharField(max_length=64, unique=True)
+    image = models.URLField(db_index=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_placeholder = models.TextField(default=None, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "stored_image"
+
+    def get_image_fields(self) -> dict:
+        """
+        Returns the image fields to set on a product, version or gallery image using this image.
+        :return: Dict with image, image_status, image_variants and image_placeholder
+        """
+        return {
+            'image': self.image,
+            'image_status': 'R',
+            'image_variants': self.image_variants,
+            'image_placeholder': self.image_placeholder,
+        }
@@ -0,0 +1,76 @@
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+from graphene import relay
+from graphql import GraphQLError
+
+# Every paginated catalog model has an index on these columns, so a page is always an index range scan.
+KEYSET_ORDERING = ('name', 'id')
+
+
+def encode_cursor(instance) -> str:
+    """
+    Builds an opaque cursor from the keyset ordering values of an instance.
+    :param instance: Model instance
+    :return: Base64 encoded cursor
+    """
+    values = [instance.name, str(instance.pk)]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Reads the keyset ordering values stored in a cursor.
+    :param cursor: Cursor returned by a previous page
+    :return: Tuple (name, id)
+    """
+    try:
+        name, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        # A malformed id would reach the query and fail with a validation error instead
+        pk = uuid.UUID(pk)
+    except (ValueError, TypeError, AttributeError):
+        raise GraphQLError('Invalid cursor')
+    if not isinstance(name, str):
+        raise GraphQLError('Invalid cursor')
+    return name, pk
+
+
+def paginate_by_keyset(queryset, connection_type, first: int = None, after: str = None):
+    """
+    Returns a Relay connection with the page that follows the ``after`` cursor.
+
+    The queryset is ordered by (name, id) and filtered with a keyset condition instead of an offset,
+    so the cost of a page does not depend on how deep it is.
+
+    :param queryset: Queryset to paginate
+    :param connection_type: Relay connection class to build
+    :param first: Page size
+    :param after: Cursor of the last element of the previous page
+    :return: Instance of connection_type
+    """
+    if first is not None and first < 1:
+        raise GraphQLError('first must be greater than 0')
+    page_size = min(first or settings.GRAPHQL_DEFAULT_PAGE_SIZE, settings.GRAPHQL_MAX_PAGE_SIZE)
+
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+    if after:
+        name, pk = decode_cursor(after)
+        # The leading name__gte bounds the index range scan, the OR alone is not used as an index condition
+        queryset = queryset.filter(Q(name__gte=name), Q(name__gt=name) | Q(name=name, id__gt=pk))
+
+    # We fetch one extra row to know if there is a next page without running a count
+    rows = list(queryset[:page_size + 1])
+    has_next_page = len(rows) > page_size
+    rows = rows[:page_size]
+
+    edges = [connection_type.Edge(node=row, cursor=encode_cursor(row)) for row in rows]
+    page_info = relay.PageInfo(
+        has_next_page=has_next_page,
+        has_previous_page=bool(after),
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    )
+    return connection_type(edges=edges, page_info=page_info)
@@ -1,23 +1,55 @@
 import graphene
+from django.conf import settings
+from graphene import relay
 from graphene_django.types import DjangoObjectType
 
 from jelly_backend.decorators import jwt_required
 from jelly_backend.permissions import IsAdminUserLoggedIn
+from jelly_backend.query_optimizer import optimize_queryset
+from products.counts import cached_count
+from products.loaders import product_images_loader, product_versions_loader, prime_product_loaders
 from products.models import Product, Group, Category, ProductImageFile, Version
+from products.pagination import paginate_by_keyset
+from products.search import search_products
+
+
+class ImageVariantType(graphene.ObjectType):
+    """
+    Resized copy of an image, see PRODUCT_IMAGE_VARIANTS.
+    """
+    name = graphene.String()
+    url = graphene.String()
+    width = graphene.Int()
+    height = graphene.Int()
+    format = graphene.String()
+
+
+def resolve_image_variants(instance, info):
+    return [ImageVariantType(name=name, **variant) for name, variant in instance.image_variants.items()]
 
 
 class ProductType(DjangoObjectType):
     images = graphene.List(lambda: ProductImageFileType)
     product_version = graphene.List(lambda: VersionType)
+    image_variants = graphene.List(ImageVariantType)
+
+    # Model fields read by the custom resolvers, used by the query optimizer
+    optimizer_dependencies = {
+        'images': ('id',),
+        'product_version': ('id',),
+    }
 
     class Meta:
         model = Product
+        exclude = ('search_document',)
+
+    resolve_image_variants = resolve_image_variants
 
     def resolve_images(self, info):
-        return ProductImageFile.objects.filter(product=self)
+        return product_images_loader(info).load(self.pk)
 
     def resolve_product_version(self, info):
-        return Version.objects.filter(product=self)
+        return product_versions_loader(info).load(self.pk)
 
 
 class GroupType(DjangoObjectType):
@@ -31,14 +63,37 @@ class CategoryType(DjangoObjectType):
 
 
 class ProductImageFileType(DjangoObjectType):
+    image_variants = graphene.List(ImageVariantType)
+
     class Meta:
         model = ProductImageFile
 
+    resolve_image_variants = resolve_image_variants
+
 
 class VersionType(DjangoObjectType):
+    image_variants = graphene.List(ImageVariantType)
+
     class Meta:
         model = Version
 
+    resolve_image_variants = resolve_image_variants
+
+
+class ProductConnection(relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class GroupConnection(relay.Connection):
+    class Meta:
+        node = GroupType
+
+
+class CategoryConnection(relay.Connection):
+    class Meta:
+        node = CategoryType
+
 
 class Query(graphene.ObjectType):
     # --- Products ---
@@ -51,6 +106,12 @@ class Query(graphene.ObjectType):
         page=graphene.Int(),
         page_size=graphene.Int()
     )
+    products_connection = graphene.Field(
+        ProductConnection,
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
 
     # --- Groups ---
     total_groups = graphene.Int(search=graphene.String())
@@ -61,6 +122,12 @@ class Query(graphene.ObjectType):
         page_size=graphene.Int()
     )
     list_groups_without_pagination = graphene.List(GroupType)
+    groups_connection = graphene.Field(
+        GroupConnection,
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
 
     # --- Categories ---
     total_categories = graphene.Int(search=graphene.String())
@@ -71,36 +138,56 @@ class Query(graphene.ObjectType):
         page_size=graphene.Int()
     )
     list_categories_without_pagination = graphene.List(CategoryType)
+    categories_connection = graphene.Field(
+        CategoryConnection,
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
 
     # --- Products ---
     def resolve_list_products_without_pagination(self, info):
         try:
-            return Product.objects.all()
+            return prime_product_loaders(info, optimize_queryset(Product.objects.all(), info))
         except Product.DoesNotExist:
             return None
 
     def resolve_get_product(self, info, id):
         try:
-            return Product.objects.get(pk=id)
+            return optimize_queryset(Product.objects.all(), info).get(pk=id)
         except Product.DoesNotExist:
             return None
 
     def resolve_total_products(self, info, search=None):
         products = Product.objects.all()
         if search:
-            products = products.filter(name__icontains=search)
-        return products.count()
+            products = search_products(products, search, ranked=False)
+        return cached_count(products, 'product', search)
 
     def resolve_list_products(self, info, search=None, page=None, page_size=None):
-        products = Product.objects.all()
+        products = optimize_queryset(Product.objects.all(), info)
 
+        # Search results are ordered by relevance, the rest of the catalog by name
         if search:
-            products = products.filter(name__icontains=search)
+            products = search_products(products, search)
+        else:
+            products = products.order_by('name', 'id')
         if page is not None and page_size is not None:
             offset = (page - 1) * page_size
             products = products[offset:offset + page_size]
 
-        return list(products)
+        return prime_product_loaders(info, products)
+
+    def resolve_products_connection(self, info, search=None, first=None, after=None):
+        products = optimize_queryset(
+            Product.objects.all(), info, path=('edges', 'node'), extra_fields=('name',)
+        )
+        if search:
+            products = search_products(products, search, ranked=False)
+
+        connection = paginate_by_keyset(products, ProductConnection, first=first, after=after)
+        prime_product_loaders(info, [edge.node for edge in connection.edges])
+        return connection
 
     # --- Groups ---
     @jwt_required(permission_required=IsAdminUserLoggedIn)
@@ -108,24 +195,34 @@ class Query(graphene.ObjectType):
         groups = Group.objects.all()
         if search:
             groups = groups.filter(name__icontains=search)
-        return groups.count()
+        return cached_count(groups, 'group', search)
 
     @jwt_required(permission_required=IsAdminUserLoggedIn)
     def resolve_list_groups(self, info, search=None, page=None, page_size=None):
-        groups = Group.objects.all()
+        groups = optimize_queryset(Group.objects.all(), info)
 
         if search:
             groups = groups.filter(name__icontains=search)
         if page is not None and page_size is not None:
             offset = (page - 1) * page_size
-            groups = groups[offset:offset + page_size]
+            groups = groups.order_by('name', 'id')[offset:offset + page_size]
 
         return list(groups)
 
+    @jwt_required(permission_required=IsAdminUserLoggedIn)
+    def resolve_groups_connection(self, info, search=None, first=None, after=None):
+        groups = optimize_queryset(
+            Group.objects.all(), info, path=('edges', 'node'), extra_fields=('name',)
+        )
+        if search:
+            groups = groups.filter(name__icontains=search)
+        return paginate_by_keyset(groups, GroupConnection, first=first, after=after)
+
     @jwt_required(permission_required=IsAdminUserLoggedIn)
     def resolve_list_groups_without_pagination(self, info):
         try:
-            return Group.objects.all()
+            groups = optimize_queryset(Group.objects.order_by('name', 'id'), info)
+            return groups.iterator(chunk_size=settings.CATALOG_EXPORT_CHUNK_SIZE)
         except Group.DoesNotExist:
             return None
 
@@ -135,23 +232,33 @@ class Query(graphene.ObjectType):
         categories = Category.objects.all()
         if search:
             categories = categories.filter(name__icontains=search)
-        return categories.count()
+        return cached_count(categories, 'category', search)
 
     @jwt_required(permission_required=IsAdminUserLoggedIn)
     def resolve_list_categories(self, info, search=None, page=None, page_size=None):
-        categories = Category.objects.all()
+        categories = optimize_queryset(Category.objects.all(), info)
 
         if search:
             categories = categories.filter(name__icontains=search)
         if page is not None and page_size is not None:
             offset = (page - 1) * page_size
-            categories = categories[offset:offset + page_size]
+            categories = categories.order_by('name', 'id')[offset:offset + page_size]
 
         return list(categories)
 
+    @jwt_required(permission_required=IsAdminUserLoggedIn)
+    def resolve_categories_connection(self, info, search=None, first=None, after=None):
+        categories = optimize_queryset(
+            Category.objects.all(), info, path=('edges', 'node'), extra_fields=('name',)
+        )
+        if search:
+            categories = categories.filter(name__icontains=search)
+        return paginate_by_keyset(categories, CategoryConnection, first=first, after=after)
+
     @jwt_required(permission_required=IsAdminUserLoggedIn)
     def resolve_list_categories_without_pagination(self, info):
         try:
-            return Category.objects.all()
+            categories = optimize_queryset(Category.objects.order_by('name', 'id'), info)
+            return categories.iterator(chunk_size=settings.CATALOG_EXPORT_CHUNK_SIZE)
         except Category.DoesNotExist:
             return None
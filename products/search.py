@@ -0,0 +1,103 @@
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+# Same default as pg_trgm.word_similarity_threshold, so both engines accept the same typos
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+def normalize_search_text(*parts) -> str:
+    """
+    Builds the text used for searching: lowercase, without accents and with single spaces.
+
+    "Canción Ñandú" becomes "cancion nandu", so Spanish names match with or without accents.
+
+    :param parts: Strings to join (e.g. name and description)
+    :return: Normalized text
+    """
+    text = ' '.join(part for part in parts if part)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(word: str) -> set:
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_similarity(term: str, document: str) -> float:
+    """
+    In-memory approximation of pg_trgm's word_similarity.
+
+    Like pg_trgm, the score is the share of the trigrams of the term found in the document, so extra
+    words in the document do not lower it. Unlike pg_trgm, each word of the term is matched with its
+    most similar word of the document, instead of with the best extent of the document, and the
+    scores are averaged.
+
+    :param term: Normalized search term
+    :param document: Normalized search document
+    :return: Similarity between 0 and 1
+    """
+    term_words = term.split()
+    document_trigrams = [_trigrams(word) for word in document.split()]
+    if not term_words or not document_trigrams:
+        return 0.0
+
+    total = 0.0
+    for word in term_words:
+        word_trigrams = _trigrams(word)
+        total += max(
+            len(word_trigrams & trigrams) / len(word_trigrams)
+            for trigrams in document_trigrams
+        )
+    return total / len(term_words)
+
+
+def search_products(queryset, search: str, ranked: bool = True):
+    """
+    Filters a product queryset by a search term.
+
+    On PostgreSQL the search runs against the trigram index of ``search_document``. Other
+    databases (e.g. SQLite in tests) rank the documents in memory with word_similarity, an
+    approximation that may accept or rank a few documents differently.
+
+    :param queryset: Product queryset
+    :param search: Search term as typed by the user
+    :param ranked: Whether to order the results by relevance
+    :return: Filtered queryset
+    """
+    term = normalize_search_text(search)
+    if not term:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.filter(
+            Q(search_document__contains=term) | Q(search_document__trigram_word_similar=term)
+        )
+        if ranked:
+            queryset = queryset.annotate(
+                search_rank=TrigramWordSimilarity(term, 'search_document')
+            ).order_by('-search_rank', 'name', 'id')
+        return queryset
+
+    scores = []
+    for pk, document in queryset.values_list('pk', 'search_document'):
+        score = 1.0 if term in document else word_similarity(term, document)
+        if score >= WORD_SIMILARITY_THRESHOLD:
+            scores.append((score, pk))
+
+    queryset = queryset.filter(pk__in=[pk for _, pk in scores])
+    if ranked and scores:
+        scores.sort(key=lambda score: -score[0])
+        queryset = queryset.order_by(
+            Case(
+                *[When(pk=pk, then=position) for position, (_, pk) in enumerate(scores)],
+                output_field=IntegerField(),
+            ),
+            'id',
+        )
+    return queryset
@@ -1,13 +1,11 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models.deletion import ProtectedError
 from rest_framework import serializers
 
-from products.models import Group, Category, Product, ProductImageFile, Version
-import os
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-
-from products.utils import upload_image_to_cloudinary
+from products.models import Group, Category, Product, ProductImageFile, StoredImage, Version
+from products.images import IMAGE_FOLDERS, create_product_images, create_with_image, non_image_fields
+from products.storage import get_image_storage
 
 
 class BaseCreateSerializer(serializers.ModelSerializer):
@@ -145,6 +143,7 @@ class ProductSerializer(serializers.ModelSerializer):
     category = serializers.UUIDField(required=True)
     group = serializers.UUIDField(required=True)
     image = serializers.URLField(required=False, read_only=True)
+    image_status = serializers.CharField(read_only=True)
 
     class Meta:
         model = Product
@@ -155,6 +154,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'price',
             'stock',
             'image',
+            'image_status',
             'category',
             'group',
         ]
@@ -193,15 +193,12 @@ class ProductSerializer(serializers.ModelSerializer):
         validated_data['category'] = category
         validated_data['group'] = group
 
-        # Upload optimized image to Cloudinary
+        # The image is optimized and stored by a Celery task, unless the same image was already stored
         image_file = self.context['request'].FILES.get('image_file')
         if image_file:
-            url = upload_image_to_cloudinary(
-                image_file=image_file,
-                folder="Products",
-            )
-            validated_data['image'] = url
-        product = Product.objects.create(**validated_data)
+            product = create_with_image(Product, image_file, **validated_data)
+        else:
+            product = Product.objects.create(**validated_data)
         self.instance = product
         return product
 
@@ -209,29 +206,17 @@ class ProductSerializer(serializers.ModelSerializer):
         old_name = instance.name
         new_name = validated_data.get('name', instance.name)
 
-        if old_name != new_name and instance.image:
+        # Deduplicated images may be shared with other products, versions and gallery images
+        if (
+            old_name != new_name
+            and instance.image
+            and not StoredImage.objects.filter(image=instance.image).exists()
+        ):
             try:
-                cloudinary.config(
-                    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-                    api_key=os.getenv("CLOUDINARY_API_KEY"),
-                    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+                validated_data['image'] = get_image_storage().rename(
+                    instance.image, folder=IMAGE_FOLDERS['product'], name=new_name
                 )
-
-                image_url = instance.image
-                parts = image_url.split('/')
-                public_id_with_folder = '/'.join(parts[7:]).split('.')[0]
-                new_public_id = f"Products/{new_name}"
-
-                response = cloudinary.uploader.rename(
-                    from_public_id=public_id_with_folder,
-                    to_public_id=new_public_id,
-                    folder="Products"
-                )
-
-                new_image_url = response['secure_url']
-                validated_data['image'] = new_image_url
-
-            except cloudinary.exceptions.Error as e:
+            except ValueError:
                 raise serializers.ValidationError('Ocurrió un error al intentar actualizar la imagen')
 
         category_id = validated_data.get('category')
@@ -249,18 +234,25 @@ class ProductSerializer(serializers.ModelSerializer):
             if attr not in ['category', 'group']:
                 setattr(instance, attr, value)
 
-        instance.save()
+        # The image fields are written by the image task, except the URL of a renamed image, which is
+        # only renamed once ready and no longer processed
+        update_fields = non_image_fields(Product)
+        if 'image' in validated_data:
+            update_fields.append('image')
+        instance.save(update_fields=update_fields)
         return instance
 
 
 class ProductImageFileSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(required=True)
+    image_status = serializers.CharField(read_only=True)
 
     class Meta:
         model = ProductImageFile
         fields = [
             'id',
             'image',
+            'image_status',
         ]
 
     def validate(self, attrs):
@@ -275,23 +267,56 @@ class ProductImageFileSerializer(serializers.ModelSerializer):
         product_id = self.context['product_id']
         product = Product.objects.get(id=product_id)
         validated_data['product'] = product
-        folder_name = f"Products/ProductsImages"
-        image = validated_data['image']
-        if image:
-            url = upload_image_to_cloudinary(
-                image_file=image,
-                folder=folder_name,
-            )
-            validated_data['image'] = url
-        product_image = ProductImageFile.objects.create(**validated_data)
+        image = validated_data.pop('image')
+        product_image = create_with_image(ProductImageFile, image, **validated_data)
         self.instance = product_image
         return product_image
 
 
+class ProductImageFileBatchSerializer(serializers.Serializer):
+    images = serializers.ListField(
+        child=serializers.FileField(),
+        allow_empty=False,
+        max_length=settings.PRODUCT_IMAGE_BATCH_MAX_FILES,
+    )
+
+    def validate(self, attrs):
+        try:
+            self.product = Product.objects.get(id=self.context['product_id'])
+        except Product.DoesNotExist:
+            raise serializers.ValidationError("El producto no existe.")
+        return attrs
+
+    def create(self, validated_data):
+        """
+        Creates a gallery image for every valid image. Invalid images are reported without failing the batch.
+        :param validated_data: Validated data with the uploaded images
+        :return: List with the result of each image, in the order they were uploaded
+        """
+        results, valid_images = [], []
+        for image in validated_data['images']:
+            result = {'file': image.name, 'id': None, 'image': None, 'image_status': None, 'error': None}
+            try:
+                serializers.ImageField().run_validation(image)
+                valid_images.append((result, image))
+            except (serializers.ValidationError, DjangoValidationError):
+                result['error'] = "El archivo no es una imagen válida."
+            results.append(result)
+
+        if valid_images:
+            product_images = create_product_images(self.product, [image for _, image in valid_images])
+            for (result, _), product_image in zip(valid_images, product_images):
+                result.update(
+                    id=str(product_image.id), image=product_image.image, image_status=product_image.image_status
+                )
+        return results
+
+
 class VersionSerializer(serializers.ModelSerializer):
     name = serializers.CharField(required=True)
     stock = serializers.IntegerField(required=True)
     image = serializers.ImageField(required=True)
+    image_status = serializers.CharField(read_only=True)
 
     class Meta:
         model = Version
@@ -300,6 +325,7 @@ class VersionSerializer(serializers.ModelSerializer):
             'name',
             'stock',
             'image',
+            'image_status',
         ]
 
     @staticmethod
@@ -323,14 +349,7 @@ class VersionSerializer(serializers.ModelSerializer):
         product_id = self.context.get('product_id')
         product = Product.objects.get(id=product_id)
         validated_data['product'] = product
-        folder_name = f"Products/ProductsVersions"
-        image = validated_data['image']
-        if image:
-            url = upload_image_to_cloudinary(
-                image_file=image,
-                folder=folder_name,
-            )
-            validated_data['image'] = url
-        version = Version.objects.create(**validated_data)
+        image = validated_data.pop('image')
+        version = create_with_image(Version, image, **validated_data)
         self.instance = version
         return version
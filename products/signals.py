@@ -0,0 +1,43 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from jelly_backend.cache_versions import bump_cache_version
+from jelly_backend.graphql_cache import invalidate_graphql_cache
+from products.models import Product, Group, Category, Version, ProductImageFile
+from products.search import normalize_search_text
+
+
+@receiver(pre_save, sender=Product)
+def update_product_search_document(sender, instance, **kwargs):
+    instance.search_document = normalize_search_text(instance.name, instance.description)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_counts(sender, instance, **kwargs):
+    bump_cache_version('product')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_counts(sender, instance, **kwargs):
+    bump_cache_version('group')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_counts(sender, instance, **kwargs):
+    bump_cache_version('category')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+@receiver(post_save, sender=ProductImageFile)
+@receiver(post_delete, sender=ProductImageFile)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_graphql_responses(sender, instance, **kwargs):
+    invalidate_graphql_cache()
@@ -0,0 +1,193 @@
+import os
+import threading
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+class ImageStorage:
+    """
+    Storage of the product images.
+
+    Implementations store encoded images in folders and return the public URL of each stored image,
+    which is what the models keep. Every method raises ValueError when the storage fails.
+    """
+    def upload(self, buffer: BytesIO, folder: str, image_format: str = 'webp') -> str:
+        """
+        Stores an encoded image with a new name.
+        :param buffer: BytesIO object containing the encoded image
+        :param folder: Folder in which to store the image
+        :param image_format: Format of the encoded image, e.g. 'webp'
+        :return: URL of the stored image
+        """
+        raise NotImplementedError
+
+    def rename(self, url: str, folder: str, name: str) -> str:
+        """
+        Moves a stored image to a new folder and name, keeping its format.
+        :param url: URL of the stored image
+        :param folder: New folder
+        :param name: New name, without extension
+        :return: New URL of the image
+        """
+        raise NotImplementedError
+
+    def delete(self, url: str) -> None:
+        """
+        Deletes a stored image. Deleting an image that does not exist is not an error.
+        :param url: URL of the stored image
+        :return: None
+        """
+        raise NotImplementedError
+
+    def variant_url(self, url: str, variant: dict) -> str | None:
+        """
+        Returns the URL of a copy of a stored image resized and encoded by the storage itself, for
+        variants that cannot be encoded locally (see PRODUCT_IMAGE_VARIANTS).
+        :param url: URL of the stored image
+        :param variant: Variant with its size, format and quality
+        :return: URL of the variant, None if the storage cannot transform images
+        """
+        return None
+
+
+class CloudinaryStorage(ImageStorage):
+    """
+    Stores the images in Cloudinary, configured by jelly_backend.cloudinary.
+    """
+    def upload(self, buffer: BytesIO, folder: str, image_format: str = 'webp') -> str:
+        try:
+            uploaded_image = cloudinary.uploader.upload(
+                file=buffer,
+                folder=folder,
+                overwrite=True,
+                resource_type="image"
+            )
+            return uploaded_image['secure_url']
+        except cloudinary.exceptions.Error:
+            raise ValueError("Cloudinary error")
+        except Exception:
+            raise ValueError("Error uploading image to Cloudinary")
+
+    def rename(self, url: str, folder: str, name: str) -> str:
+        try:
+            response = cloudinary.uploader.rename(
+                from_public_id=self.public_id(url),
+                to_public_id=f'{folder}/{name}',
+            )
+            return response['secure_url']
+        except cloudinary.exceptions.Error:
+            raise ValueError("Cloudinary error")
+
+    def delete(self, url: str) -> None:
+        try:
+            cloudinary.uploader.destroy(self.public_id(url), resource_type="image", invalidate=True)
+        except cloudinary.exceptions.Error:
+            raise ValueError("Cloudinary error")
+
+    def variant_url(self, url: str, variant: dict) -> str | None:
+        size = variant['size']
+        transformation = f"c_limit,w_{size},h_{size},f_{variant['format'].lower()},q_{variant['quality']}"
+        return url.replace('/upload/', f'/upload/{transformation}/', 1)
+
+    @staticmethod
+    def public_id(url: str) -> str:
+        # https://res.cloudinary.com/<cloud>/image/upload/<version>/<folder>/<name>.<extension>
+        parts = url.split('/')
+        return '/'.join(parts[7:]).rsplit('.', 1)[0]
+
+
+class LocalStorage(ImageStorage):
+    """
+    Stores the images in PRODUCT_IMAGE_STORAGE_DIR, served at PRODUCT_IMAGE_STORAGE_URL.
+    Meant for development, load tests and benchmarks, the web server must serve the directory.
+    """
+    def __init__(self, directory: str = None, base_url: str = None):
+        self.directory = Path(directory or settings.PRODUCT_IMAGE_STORAGE_DIR)
+        self.base_url = base_url or settings.PRODUCT_IMAGE_STORAGE_URL
+
+    def upload(self, buffer: BytesIO, folder: str, image_format: str = 'webp') -> str:
+        key = f'{folder}/{uuid.uuid4().hex}.{image_format.lower()}'
+        try:
+            path = self.directory / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(buffer.getvalue())
+        except OSError:
+            raise ValueError("Error storing image")
+        return self.base_url + key
+
+    def rename(self, url: str, folder: str, name: str) -> str:
+        key = self.key(url)
+        new_key = f'{folder}/{name}{os.path.splitext(key)[1]}'
+        try:
+            new_path = self.directory / new_key
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.directory / key, new_path)
+        except OSError:
+            raise ValueError("Error renaming image")
+        return self.base_url + new_key
+
+    def delete(self, url: str) -> None:
+        try:
+            (self.directory / self.key(url)).unlink(missing_ok=True)
+        except OSError:
+            raise ValueError("Error deleting image")
+
+    def key(self, url: str) -> str:
+        if not url.startswith(self.base_url):
+            raise ValueError("The image is not stored in this storage")
+        return url[len(self.base_url):]
+
+
+class MemoryStorage(ImageStorage):
+    """
+    Keeps the images in memory, for tests and benchmarks.
+
+    Attributes:
+    files: Content of each stored image, by URL
+    """
+    base_url = 'memory://'
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def upload(self, buffer: BytesIO, folder: str, image_format: str = 'webp') -> str:
+        url = f'{self.base_url}{folder}/{uuid.uuid4().hex}.{image_format.lower()}'
+        with self.lock:
+            self.files[url] = buffer.getvalue()
+        return url
+
+    def rename(self, url: str, folder: str, name: str) -> str:
+        new_url = f'{self.base_url}{folder}/{name}{os.path.splitext(url)[1]}'
+        with self.lock:
+            try:
+                self.files[new_url] = self.files.pop(url)
+            except KeyError:
+                raise ValueError("The image does not exist")
+        return new_url
+
+    def delete(self, url: str) -> None:
+        with self.lock:
+            self.files.pop(url, None)
+
+
+def get_image_storage() -> ImageStorage:
+    """
+    Returns the storage of the product images of this process, the class set in PRODUCT_IMAGE_STORAGE.
+    :return: ImageStorage
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = import_string(settings.PRODUCT_IMAGE_STORAGE)()
+    return _storage
@@ -0,0 +1,20 @@
+from celery import shared_task
+from django.conf import settings
+
+from products.images import run_product_image_job
+from products.utils import ImageDecodeError
+
+
+@shared_task(
+    bind=True,
+    name='process_product_image',
+    autoretry_for=(ValueError, OSError),
+    dont_autoretry_for=(ImageDecodeError,),
+    max_retries=settings.PRODUCT_IMAGE_MAX_RETRIES,
+    retry_backoff=True,
+)
+def process_product_image(self, model_name: str, object_id: str, digest: str = None):
+    # Storage and network errors are transient, the image is only marked as failed on the last attempt.
+    # Images that cannot be decoded fail at once
+    last_attempt = self.request.retries >= self.max_retries
+    run_product_image_job(model_name, object_id, digest, last_attempt=last_attempt)
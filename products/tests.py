@@ -1,3 +1,635 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql import GraphQLError
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from jelly_backend.utils.spool import spool_upload
+from products import storage
+from products.counts import cached_count
+from products.images import create_with_image, run_product_image_job, spooled_image_path, store_image
+from products.models import Category, Group, Product, ProductImageFile, StoredImage, Version
+from products.pagination import decode_cursor, encode_cursor, paginate_by_keyset
+from products.schema import GroupConnection
+from products.search import WORD_SIMILARITY_THRESHOLD, normalize_search_text, search_products, word_similarity
+from products.serializers import ProductSerializer
+from products.tasks import process_product_image
+from products.utils import (
+    ImageDecodeError,
+    generate_image_placeholder,
+    generate_image_variants,
+    open_image,
+    upload_product_image,
+)
+from products.views import CreateProductImageFileBatchAPIView, DisableProductView, ExportGroupsView, ExportProductsView
+from users.models import User
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        for name in ('BTS', 'Blackpink', 'BTS', 'Twice', 'BTS'):
+            Group.objects.create(name=name)
+
+    def paginate(self, first=None, after=None):
+        return paginate_by_keyset(Group.objects.all(), GroupConnection, first=first, after=after)
+
+    def test_pages_follow_the_keyset_ordering(self):
+        ids = []
+        after = None
+        while True:
+            page = self.paginate(first=2, after=after)
+            ids += [edge.node.id for edge in page.edges]
+            if not page.page_info.has_next_page:
+                break
+            after = page.page_info.end_cursor
+
+        self.assertEqual(ids, list(Group.objects.order_by('name', 'id').values_list('id', flat=True)))
+
+    def test_cursor_condition_starts_with_a_range_on_name(self):
+        after = encode_cursor(Group.objects.order_by('name', 'id').first())
+        with CaptureQueriesContext(connection) as queries:
+            self.paginate(first=2, after=after)
+        self.assertIn('"name" >= ', queries[0]['sql'])
+
+    def test_first_must_be_positive(self):
+        for first in (0, -1):
+            with self.subTest(first=first):
+                with self.assertRaisesMessage(GraphQLError, 'first must be greater than 0'):
+                    self.paginate(first=first)
+
+    def test_page_size_is_capped(self):
+        Group.objects.bulk_create(Group(name=f'Group {i:03}') for i in range(settings.GRAPHQL_MAX_PAGE_SIZE + 5))
+        page = self.paginate(first=settings.GRAPHQL_MAX_PAGE_SIZE * 10)
+        self.assertEqual(len(page.edges), settings.GRAPHQL_MAX_PAGE_SIZE)
+        self.assertTrue(page.page_info.has_next_page)
+
+    def test_invalid_cursors(self):
+        cursors = [
+            'not a cursor',
+            base64.urlsafe_b64encode(b'["BTS", "not-a-uuid"]').decode(),
+            base64.urlsafe_b64encode(b'["BTS", 1]').decode(),
+            base64.urlsafe_b64encode(b'[1, "00000000-0000-0000-0000-000000000000"]').decode(),
+            base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                with self.assertRaisesMessage(GraphQLError, 'Invalid cursor'):
+                    decode_cursor(cursor)
+                with self.assertRaisesMessage(GraphQLError, 'Invalid cursor'):
+                    self.paginate(after=cursor)
+
+
+class WordSimilarityTests(TestCase):
+
+    def test_normalize_search_text(self):
+        self.assertEqual(normalize_search_text('  Canción ', 'ÑANDÚ'), 'cancion nandu')
+
+    def test_score_is_the_share_of_the_term_trigrams(self):
+        # 5 of the 8 trigrams of "cansion" are in "cancion"
+        self.assertEqual(word_similarity('cansion', 'cancion'), 0.625)
+        self.assertGreaterEqual(word_similarity('cansion', 'cancion'), WORD_SIMILARITY_THRESHOLD)
+
+    def test_extra_document_words_do_not_lower_the_score(self):
+        self.assertEqual(word_similarity('cancion', 'la cancion del verano'), 1.0)
+        self.assertEqual(word_similarity('cancion', 'cancionero'), word_similarity('cancion', 'cancioneros'))
+
+    def test_unrelated_words(self):
+        self.assertLess(word_similarity('album', 'poster'), WORD_SIMILARITY_THRESHOLD)
+        self.assertEqual(word_similarity('', 'poster'), 0.0)
+
+    def test_search_products_accepts_typos(self):
+        category = Category.objects.create(name='Álbumes')
+        group = Group.objects.create(name='BTS')
+        song = Product.objects.create(name='Canción de invierno', category=category, group=group)
+        Product.objects.create(name='Poster', category=category, group=group)
+
+        self.assertEqual(list(search_products(Product.objects.all(), 'cansion')), [song])
+
+
+@override_settings(CATALOG_APPROXIMATE_COUNTS=False)
+class CachedCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def count_groups(self, search: str) -> int:
+        return cached_count(Group.objects.filter(name__icontains=search), 'group', search)
+
+    def test_accent_sensitive_searches_have_their_own_entry(self):
+        Group.objects.create(name='Álbum de fotos')
+        Group.objects.create(name='Album de fotos')
+        Group.objects.create(name='Album de stickers')
+
+        self.assertEqual(self.count_groups('Álbum'), 1)
+        self.assertEqual(self.count_groups('album'), 2)
+
+    def test_counts_are_cached(self):
+        Group.objects.create(name='Album')
+        self.assertEqual(self.count_groups('album'), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count_groups('album'), 1)
+
+    def test_equivalent_product_searches_share_an_entry(self):
+        self.assertEqual(cached_count(Product.objects.all(), 'product', 'Álbum '), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(Product.objects.all(), 'product', 'album'), 0)
+
+
+@override_settings(PRODUCT_IMAGE_STORAGE='products.storage.MemoryStorage')
+class ProductImageJobTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        spool_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        spool_settings = override_settings(PRODUCT_IMAGE_SPOOL_DIR=spool_dir)
+        spool_settings.enable()
+        cls.addClassCleanup(spool_settings.disable)
+
+    def setUp(self):
+        storage._storage = None
+        self.addCleanup(setattr, storage, '_storage', None)
+        self.product = Product.objects.create(
+            name='Map of the Soul: 7',
+            category=Category.objects.create(name='Álbumes'),
+            group=Group.objects.create(name='BTS'),
+            image_status='P',
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'purple').save(buffer, format='PNG')
+        buffer.seek(0)
+        spool_upload(buffer, os.path.dirname(self.path), os.path.basename(self.path))
+
+    @property
+    def path(self) -> str:
+        return spooled_image_path('product', self.product.id)
+
+    def test_pending_image_is_stored(self):
+        run_product_image_job('product', str(self.product.id))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'R')
+        self.assertIn(self.product.image, storage.get_image_storage().files)
+        self.assertTrue(self.product.image_placeholder.startswith('data:image/webp'))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failed_attempt_keeps_the_image_for_the_retry(self):
+        with mock.patch('products.images.store_image', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                run_product_image_job('product', str(self.product.id), last_attempt=False)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'P')
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_failed_last_attempt_marks_the_image_as_failed(self):
+        with mock.patch('products.images.store_image', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                run_product_image_job('product', str(self.product.id), last_attempt=True)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'E')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_image_no_longer_pending_is_discarded(self):
+        Product.objects.filter(id=self.product.id).update(image_status='R')
+        run_product_image_job('product', str(self.product.id))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_task_retries_transient_errors(self):
+        failures = [ValueError('Error uploading image to Cloudinary')]
+
+        def flaky_store_image(*args):
+            if failures:
+                raise failures.pop()
+            return store_image(*args)
+
+        with mock.patch('products.images.store_image', side_effect=flaky_store_image):
+            process_product_image.apply(kwargs={'model_name': 'product', 'object_id': str(self.product.id)})
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'R')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_task_marks_the_image_as_failed_after_the_last_retry(self):
+        with mock.patch('products.images.store_image', side_effect=ValueError) as store_image:
+            result = process_product_image.apply(kwargs={'model_name': 'product', 'object_id': str(self.product.id)})
+
+        self.assertIsInstance(result.result, ValueError)
+        self.assertEqual(store_image.call_count, process_product_image.max_retries + 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'E')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_undecodable_image_fails_without_retries(self):
+        spool_upload(BytesIO(b'not an image'), os.path.dirname(self.path), os.path.basename(self.path))
+
+        with mock.patch('products.images.upload_product_image', side_effect=upload_product_image) as upload:
+            result = process_product_image.apply(kwargs={'model_name': 'product', 'object_id': str(self.product.id)})
+
+        self.assertIsInstance(result.result, ImageDecodeError)
+        self.assertEqual(upload.call_count, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'E')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failed_upload_deletes_the_stored_files(self):
+        image_storage = storage.get_image_storage()
+        original_upload = image_storage.upload
+
+        def upload(buffer, folder, image_format='webp'):
+            if folder.endswith('/Variants') and image_format.lower() == 'webp':
+                raise ValueError('Error uploading image to Cloudinary')
+            return original_upload(buffer, folder, image_format)
+
+        with mock.patch.object(image_storage, 'upload', side_effect=upload) as storage_upload:
+            with self.assertRaises(ValueError):
+                run_product_image_job('product', str(self.product.id), last_attempt=False)
+
+        self.assertGreater(storage_upload.call_count, 1)
+        self.assertEqual(image_storage.files, {})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'P')
+
+
+class ProductEditDuringImageProcessingTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='MAP OF THE SOUL: 7',
+            description='Álbum',
+            category=Category.objects.create(name='Álbumes'),
+            group=Group.objects.create(name='BTS'),
+            image_status='P',
+        )
+        # The view loads the product while the image task is still running
+        self.loaded_product = Product.objects.get(id=self.product.id)
+        Product.objects.filter(id=self.product.id).update(
+            image='memory://Products/image.webp', image_status='R', image_placeholder='data:image/webp;base64,'
+        )
+
+    def assertImageKept(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, 'R')
+        self.assertEqual(self.product.image, 'memory://Products/image.webp')
+
+    def test_update_keeps_the_processed_image(self):
+        serializer = ProductSerializer(self.loaded_product, data={
+            'name': 'Map of the Soul: Persona',
+            'description': 'álbum',
+            'price': 20000,
+            'stock': 5,
+            'category': self.product.category_id,
+            'group': self.product.group_id,
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.assertImageKept()
+        self.assertEqual(self.product.name, 'MAP OF THE SOUL: PERSONA')
+        self.assertEqual(self.product.search_document, 'map of the soul: persona album')
+
+    def test_disable_keeps_the_processed_image(self):
+        admin = User.objects.create_user(email='admin@jelly.cl', first_name='Ana', last_name='Pérez', user_admin=True)
+        request = APIRequestFactory().post(f'/products/disable/{self.product.id}/')
+        force_authenticate(request, user=admin)
+        with mock.patch('products.views.Product.objects.get', return_value=self.loaded_product):
+            response = DisableProductView.as_view()(request, product_id=self.product.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertImageKept()
+        self.assertTrue(self.product.is_disabled)
+
+
+def encoded_image(size: tuple, image_format: str = 'PNG', **params) -> BytesIO:
+    buffer = BytesIO()
+    Image.new('RGB', size, 'purple').save(buffer, format=image_format, **params)
+    buffer.seek(0)
+    return buffer
+
+
+@override_settings(PRODUCT_IMAGE_VARIANTS={
+    'thumb': {'size': 160, 'format': 'WEBP', 'quality': 70},
+    'card': {'size': 480, 'format': 'WEBP', 'quality': 78},
+    'detail': {'size': 1200, 'format': 'WEBP', 'quality': 82},
+    'detail_jxl': {'size': 1200, 'format': 'NOT-A-FORMAT', 'quality': 60},
+})
+class ImageVariantTests(SimpleTestCase):
+
+    def sizes(self, variants: dict) -> dict:
+        return {name: (variant['width'], variant['height']) for name, variant in variants.items()}
+
+    def test_variants_fit_their_size(self):
+        variants = generate_image_variants(open_image(encoded_image((2000, 1000))))
+
+        self.assertEqual(self.sizes(variants), {'thumb': (160, 80), 'card': (480, 240), 'detail': (1200, 600)})
+        for name, variant in variants.items():
+            with Image.open(variant['buffer']) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', self.sizes(variants)[name]))
+
+    def test_small_images_are_not_upscaled(self):
+        variants = generate_image_variants(open_image(encoded_image((300, 150))))
+        self.assertEqual(self.sizes(variants), {'thumb': (160, 80), 'card': (300, 150), 'detail': (300, 150)})
+
+    def test_exif_orientation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees
+        image = open_image(encoded_image((200, 100), 'JPEG', exif=exif))
+        self.assertEqual(image.size, (100, 200))
+
+    def test_placeholder_is_a_tiny_webp(self):
+        placeholder = generate_image_placeholder(open_image(encoded_image((2000, 1000))))
+        self.assertTrue(placeholder.startswith('data:image/webp;base64,'))
+        with Image.open(BytesIO(base64.b64decode(placeholder.split(',', 1)[1]))) as image:
+            self.assertEqual(image.size, (settings.PRODUCT_IMAGE_PLACEHOLDER_SIZE, 8))
+
+    @override_settings(PRODUCT_IMAGE_STORAGE='products.storage.MemoryStorage')
+    def test_formats_pillow_cannot_encode_are_left_to_the_storage(self):
+        storage._storage = None
+        self.addCleanup(setattr, storage, '_storage', None)
+
+        self.assertNotIn('detail_jxl', generate_image_variants(open_image(encoded_image((2000, 1000)))))
+        # MemoryStorage cannot transform images, so the variant is left out
+        uploaded = upload_product_image(encoded_image((2000, 1000)), 'Products')
+        self.assertEqual(sorted(uploaded['variants']), ['card', 'detail', 'thumb'])
+
+        with mock.patch.object(storage.MemoryStorage, 'variant_url', return_value='memory://transformed.jxl'):
+            uploaded = upload_product_image(encoded_image((2000, 1000)), 'Products')
+        self.assertEqual(uploaded['variants']['detail_jxl'], {
+            'width': 1200, 'height': 600, 'format': 'not-a-format', 'url': 'memory://transformed.jxl',
+        })
+
+
+class LocalStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.directory = directory
+        self.storage = storage.LocalStorage(directory, '/media/products/')
+
+    def path(self, url: str) -> str:
+        return os.path.join(self.directory, self.storage.key(url))
+
+    def test_upload_rename_and_delete(self):
+        url = self.storage.upload(BytesIO(b'image'), 'Products', 'WEBP')
+        self.assertRegex(url, r'^/media/products/Products/[0-9a-f]{32}\.webp$')
+
+        renamed = self.storage.rename(url, 'Products', 'Map of the Soul')
+        self.assertEqual(renamed, '/media/products/Products/Map of the Soul.webp')
+        self.assertFalse(os.path.exists(self.path(url)))
+        with open(self.path(renamed), 'rb') as file:
+            self.assertEqual(file.read(), b'image')
+
+        self.storage.delete(renamed)
+        self.storage.delete(renamed)
+        self.assertFalse(os.path.exists(self.path(renamed)))
+
+    def test_renaming_a_missing_image_fails(self):
+        with self.assertRaisesMessage(ValueError, 'Error renaming image'):
+            self.storage.rename('/media/products/Products/missing.webp', 'Products', 'name')
+
+    def test_images_of_other_storages_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'The image is not stored in this storage'):
+            self.storage.delete('https://res.cloudinary.com/jelly/image/upload/v1/Products/image.webp')
+
+    def test_variants_cannot_be_transformed(self):
+        variant = settings.PRODUCT_IMAGE_VARIANTS['thumb']
+        self.assertIsNone(self.storage.variant_url('/media/products/Products/image.webp', variant))
+
+
+class CloudinaryStorageTests(SimpleTestCase):
+    url = 'https://res.cloudinary.com/jelly/image/upload/v1700000000/Products/Variants/image.webp'
+
+    def test_rename_moves_the_public_id(self):
+        response = {'secure_url': 'https://res.cloudinary.com/jelly/image/upload/v2/Products/BTS.webp'}
+        with mock.patch('cloudinary.uploader.rename', return_value=response) as rename:
+            url = storage.CloudinaryStorage().rename(self.url, 'Products', 'BTS')
+
+        rename.assert_called_once_with(from_public_id='Products/Variants/image', to_public_id='Products/BTS')
+        self.assertEqual(url, response['secure_url'])
+
+    def test_rename_errors_are_value_errors(self):
+        import cloudinary.exceptions
+
+        with mock.patch('cloudinary.uploader.rename', side_effect=cloudinary.exceptions.Error):
+            with self.assertRaisesMessage(ValueError, 'Cloudinary error'):
+                storage.CloudinaryStorage().rename(self.url, 'Products', 'BTS')
+
+    def test_variant_url_is_a_transformation_of_the_image(self):
+        variant = {'size': 480, 'format': 'AVIF', 'quality': 55}
+        self.assertEqual(
+            storage.CloudinaryStorage().variant_url(self.url, variant),
+            'https://res.cloudinary.com/jelly/image/upload/c_limit,w_480,h_480,f_avif,q_55/v1700000000/'
+            'Products/Variants/image.webp',
+        )
+
+
+class ImageDeduplicationTests(TestCase):
+
+    def setUp(self):
+        self.content = encoded_image((64, 48)).getvalue()
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.stored_image = StoredImage.objects.create(
+            digest=self.digest,
+            image='memory://Products/image.webp',
+            image_variants={'thumb': {'url': 'memory://Products/Variants/thumb.webp'}},
+            image_placeholder='data:image/webp;base64,',
+        )
+        self.category = Category.objects.create(name='Álbumes')
+        self.group = Group.objects.create(name='BTS')
+
+    def test_known_image_is_reused_without_processing(self):
+        image_file = SimpleUploadedFile('image.png', self.content, content_type='image/png')
+        with mock.patch('products.images.enqueue_image_upload') as enqueue_image_upload:
+            product = create_with_image(Product, image_file, name='BTS', category=self.category, group=self.group)
+
+        enqueue_image_upload.assert_not_called()
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, 'R')
+        self.assertEqual(product.image, self.stored_image.image)
+        self.assertEqual(product.image_variants, self.stored_image.image_variants)
+
+    def test_new_image_is_processed(self):
+        image_file = SimpleUploadedFile('image.png', encoded_image((32, 32)).getvalue(), content_type='image/png')
+        with mock.patch('products.images.enqueue_image_upload') as enqueue_image_upload:
+            product = create_with_image(Product, image_file, name='BTS', category=self.category, group=self.group)
+
+        self.assertEqual(product.image_status, 'P')
+        enqueue_image_upload.assert_called_once()
+
+    def test_store_image_reuses_the_index(self):
+        with mock.patch('products.images.upload_product_image') as upload_product_image:
+            self.assertEqual(store_image(self.content, 'Products', self.digest), self.stored_image)
+        upload_product_image.assert_not_called()
+
+    def test_store_image_keeps_the_image_stored_first(self):
+        digest = hashlib.sha256(b'other').hexdigest()
+
+        def upload_product_image(image_file, folder):
+            # Another worker stores the same bytes while this one uploads them
+            StoredImage.objects.create(digest=digest, image='memory://Products/first.webp')
+            return {'image': 'memory://Products/second.webp', 'variants': {}, 'placeholder': None}
+
+        with mock.patch('products.images.upload_product_image', side_effect=upload_product_image):
+            stored_image = store_image(b'other', 'Products', digest)
+
+        self.assertEqual(stored_image.image, 'memory://Products/first.webp')
+        self.assertEqual(StoredImage.objects.filter(digest=digest).count(), 1)
+
+
+class ProductImageBatchUploadTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        spool_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        spool_settings = override_settings(PRODUCT_IMAGE_SPOOL_DIR=spool_dir)
+        spool_settings.enable()
+        cls.addClassCleanup(spool_settings.disable)
+
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@jelly.cl', first_name='Ana', last_name='Pérez', user_admin=True)
+        self.product = Product.objects.create(
+            name='BTS', category=Category.objects.create(name='Álbumes'), group=Group.objects.create(name='BTS')
+        )
+        stored_content = encoded_image((16, 16)).getvalue()
+        self.stored_image = StoredImage.objects.create(
+            digest=hashlib.sha256(stored_content).hexdigest(), image='memory://Products/image.webp'
+        )
+        self.files = {
+            'new': SimpleUploadedFile('new.png', encoded_image((64, 48)).getvalue(), content_type='image/png'),
+            'stored': SimpleUploadedFile('stored.png', stored_content, content_type='image/png'),
+            'text': SimpleUploadedFile('notes.txt', b'not an image', content_type='text/plain'),
+        }
+
+    def upload(self, *names):
+        request = APIRequestFactory().post(
+            f'/products/upload-images/{self.product.id}/', {'images': [self.files[name] for name in names]},
+            format='multipart',
+        )
+        force_authenticate(request, user=self.admin)
+        return CreateProductImageFileBatchAPIView.as_view()(request, product_id=self.product.id)
+
+    def test_each_file_has_its_own_result(self):
+        response = self.upload('new', 'text', 'stored')
+
+        self.assertEqual(response.status_code, 201)
+        new, text, stored = response.data
+        self.assertEqual((new['file'], new['image_status'], new['error']), ('new.png', 'P', None))
+        self.assertEqual((text['id'], text['error']), (None, 'El archivo no es una imagen válida.'))
+        self.assertEqual((stored['image_status'], stored['image']), ('R', self.stored_image.image))
+        self.assertEqual(ProductImageFile.objects.filter(product=self.product).count(), 2)
+        # Only the new image is spooled for the task
+        self.assertTrue(os.path.exists(spooled_image_path('productimagefile', new['id'])))
+        self.assertFalse(os.path.exists(spooled_image_path('productimagefile', stored['id'])))
+
+    def test_batch_without_valid_images_is_rejected(self):
+        response = self.upload('text')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0]['error'], 'El archivo no es una imagen válida.')
+        self.assertFalse(ProductImageFile.objects.exists())
+
+    def test_images_are_inserted_together_and_the_catalog_cache_is_invalidated(self):
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('products.images.invalidate_graphql_cache') as invalidate_graphql_cache:
+            response = self.upload('new', 'stored')
+
+        self.assertEqual(response.status_code, 201)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "product_image_file"')]
+        self.assertEqual(len(inserts), 1)
+        invalidate_graphql_cache.assert_called_once_with()
+
+
+class ProductRelatedListLoaderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Álbumes')
+        group = Group.objects.create(name='BTS')
+        self.products = []
+        for name in ('Be', 'Butter', 'Proof'):
+            product = Product.objects.create(name=name, category=category, group=group)
+            ProductImageFile.objects.create(product=product, image=f'https://jelly.cl/{name}.webp')
+            Version.objects.create(product=product, name=f'{name} Standard')
+            self.products.append(product)
+
+    def post(self, query: str):
+        response = self.client.post('/graphql', json.dumps({'query': query}), content_type='application/json')
+        self.assertNotIn('errors', response.json())
+        return response.json()['data']
+
+    def test_related_lists_are_loaded_with_one_query_each(self):
+        query = '{ listProducts(page: 1, pageSize: 10) { name images { image } productVersion { name } } }'
+        # Products, images and versions, whatever the number of products
+        with self.assertNumQueries(3):
+            products = self.post(query)['listProducts']
+
+        self.assertEqual(len(products), 3)
+        for product in products:
+            self.assertEqual(product['images'], [{'image': f'https://jelly.cl/{product["name"]}.webp'}])
+            self.assertEqual(product['productVersion'], [{'name': f'{product["name"]} Standard'}])
+
+    def test_connection_nodes_share_the_loaders(self):
+        query = '{ productsConnection(first: 2) { edges { node { name images { image } } } } }'
+        with self.assertNumQueries(2):
+            edges = self.post(query)['productsConnection']['edges']
+
+        self.assertEqual([edge['node']['name'] for edge in edges], ['Be', 'Butter'])
+        self.assertEqual(edges[1]['node']['images'], [{'image': 'https://jelly.cl/Butter.webp'}])
+
+
+@override_settings(CATALOG_EXPORT_CHUNK_SIZE=2)
+class NDJSONExportTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@jelly.cl', first_name='Ana', last_name='Pérez', user_admin=True
+        )
+        self.category = Category.objects.create(name='Álbumes')
+        self.groups = [Group.objects.create(name=name) for name in ('Twice', 'BTS', 'Aespa')]
+
+    def export(self, view_class):
+        request = APIRequestFactory().get('/products/export/')
+        force_authenticate(request, user=self.admin)
+        return view_class.as_view()(request)
+
+    def test_rows_are_streamed_in_chunks(self):
+        iterator = QuerySet.iterator
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=iterator) as queryset_iterator:
+            # Nothing is read until the response is consumed
+            with self.assertNumQueries(0):
+                response = self.export(ExportGroupsView)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(queryset_iterator.call_args.kwargs, {'chunk_size': 2})
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Aespa', 'BTS', 'Twice'])
+
+    def test_product_rows_are_encoded_as_json(self):
+        product = Product.objects.create(name='Be', price=25990, category=self.category, group=self.groups[1])
+
+        response = self.export(ExportProductsView)
+
+        row = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(row['id'], str(product.id))
+        self.assertEqual((row['price'], row['group_id']), (25990, str(self.groups[1].id)))
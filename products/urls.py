@@ -10,7 +10,11 @@ from products.views import (
     ProductUpdateView,
     DisableProductView,
     CreateProductImageFileAPIView,
+    CreateProductImageFileBatchAPIView,
     CreateVersionAPIView,
+    ExportProductsView,
+    ExportGroupsView,
+    ExportCategoriesView,
 )
 
 urlpatterns = [
@@ -24,5 +28,9 @@ urlpatterns = [
     path('update/<uuid:product_id>/', ProductUpdateView.as_view(), name='product-update'),
     path('disable/<uuid:product_id>/', DisableProductView.as_view(), name='product-disable'),
     path('upload-image/<uuid:product_id>/', CreateProductImageFileAPIView.as_view(), name='upload-image'),
+    path('upload-images/<uuid:product_id>/', CreateProductImageFileBatchAPIView.as_view(), name='upload-images'),
     path('create-version/<uuid:product_id>/', CreateVersionAPIView.as_view(), name='create-version'),
+    path('export/', ExportProductsView.as_view(), name='product-export'),
+    path('groups-export/', ExportGroupsView.as_view(), name='group-export'),
+    path('categories-export/', ExportCategoriesView.as_view(), name='category-export'),
 ]
@@ -1,35 +1,175 @@
-import cloudinary
-import cloudinary.uploader
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
+
+from products.storage import get_image_storage
+
+_upload_executor = None
+_upload_executor_lock = threading.Lock()
+
+
+class ImageDecodeError(ValueError):
+    """
+    Raised when an uploaded image cannot be decoded or encoded. Unlike storage errors, retrying does not help.
+    """
+
+
+def get_upload_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool of this process used to store an image and its variants concurrently.
+    The pool is created on first use, so forked workers never inherit the threads of their parent.
+    :return: ThreadPoolExecutor
+    """
+    global _upload_executor
+    if _upload_executor is None:
+        with _upload_executor_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(
+                    max_workers=settings.PRODUCT_IMAGE_UPLOAD_THREADS,
+                    thread_name_prefix='product-image-upload',
+                )
+    return _upload_executor
+
+
+def open_image(image_file: BytesIO) -> Image.Image:
+    """
+    Opens an uploaded image, applying its EXIF orientation.
+    :param image_file: File-like object containing the image
+    :return: RGB image, or RGBA if the image has transparency
+    """
+    image = Image.open(image_file)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def encode_image(image: Image.Image, image_format: str, quality: int) -> BytesIO:
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+def get_supported_variants() -> dict:
+    """
+    Returns the configured image variants the installed Pillow can encode.
+    :return: Dict of PRODUCT_IMAGE_VARIANTS
+    """
+    Image.init()
+    return {
+        name: variant for name, variant in settings.PRODUCT_IMAGE_VARIANTS.items()
+        if variant['format'].upper() in Image.SAVE
+    }
 
 
-def upload_image_to_cloudinary(
-        image_file: BytesIO,
-        folder: str,
-) -> str:
+def generate_image_variants(image: Image.Image) -> dict:
     """
-    Function to upload an image to Cloudinary
+    Generates the resized copies of an image configured in PRODUCT_IMAGE_VARIANTS.
 
+    Variants are resized from the largest to the smallest, each one from the previous copy instead of
+    the full size image, so small variants are cheap.
+
+    :param image: Image returned by open_image
+    :return: Dict with the encoded buffer, width, height and format of each variant, by name
+    """
+    variants = {}
+    source = image
+    by_size = sorted(get_supported_variants().items(), key=lambda item: item[1]['size'], reverse=True)
+    for name, variant in by_size:
+        if max(source.size) > variant['size']:
+            source = source.copy()
+            source.thumbnail((variant['size'], variant['size']), Image.LANCZOS)
+        variants[name] = {
+            'buffer': encode_image(source, variant['format'], variant['quality']),
+            'width': source.width,
+            'height': source.height,
+            'format': variant['format'].lower(),
+        }
+    return variants
+
+
+def generate_image_placeholder(image: Image.Image) -> str:
+    """
+    Generates a tiny version of an image to show, blurred, while the image loads.
+    :param image: Image returned by open_image
+    :return: WEBP data URI, a few hundred bytes long
+    """
+    size = settings.PRODUCT_IMAGE_PLACEHOLDER_SIZE
+    placeholder = image.copy()
+    placeholder.thumbnail((size, size), Image.BILINEAR)
+    buffer = encode_image(placeholder, 'WEBP', 40)
+    return f'data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}'
+
+
+def fit_size(size: tuple, long_edge: int) -> tuple:
+    scale = min(1, long_edge / max(size))
+    return round(size[0] * scale), round(size[1] * scale)
+
+
+def upload_product_image(image_file: BytesIO, folder: str) -> dict:
+    """
+    Stores an image at full size, together with its variants and placeholder, in the configured storage.
     :param image_file: BytesIO object containing the image to upload
-    :param folder: Folder in which to store the image
-    :return: URL of the uploaded image
+    :param folder: Folder in which to store the image, variants are stored in its Variants subfolder
+    :return: Dict with the image URL, the variants (url, width, height and format by name) and the placeholder
     """
     try:
-        # Open and process the image using Pillow
-        image = Image.open(image_file)
-        buffer = BytesIO()
-        image.save(buffer, format='WEBP', optimize=True, quality=100)
-        buffer.seek(0)
-
-        uploaded_image = cloudinary.uploader.upload(
-            file=buffer,
-            folder=folder,
-            overwrite=True,
-            resource_type="image"
-        )
-        return uploaded_image['secure_url']
-    except cloudinary.exceptions.Error:
-        raise ValueError(f"Cloudinary error")
+        image = open_image(image_file)
+        encoded_variants = generate_image_variants(image)
+        placeholder = generate_image_placeholder(image)
+        buffer = encode_image(image, 'WEBP', settings.PRODUCT_IMAGE_QUALITY)
     except Exception:
-        raise ValueError(f"Error uploading image to Cloudinary")
+        raise ImageDecodeError("Error processing the image")
+
+    # Uploads are network bound, so the image and its variants are stored concurrently
+    storage = get_image_storage()
+    executor = get_upload_executor()
+    image_future = executor.submit(storage.upload, buffer, folder)
+    variant_futures = {
+        name: executor.submit(storage.upload, encoded.pop('buffer'), f'{folder}/Variants', encoded['format'])
+        for name, encoded in encoded_variants.items()
+    }
+
+    try:
+        url = image_future.result()
+        variant_urls = {name: future.result() for name, future in variant_futures.items()}
+    except Exception:
+        # A retry stores everything again, so the files stored by this attempt would be orphaned
+        delete_uploaded(storage, [image_future, *variant_futures.values()])
+        raise
+
+    variants = {}
+    for name, variant in settings.PRODUCT_IMAGE_VARIANTS.items():
+        if name in variant_urls:
+            variants[name] = dict(encoded_variants[name], url=variant_urls[name])
+            continue
+
+        variant_url = storage.variant_url(url, variant)
+        if variant_url:
+            width, height = fit_size(image.size, variant['size'])
+            variants[name] = {'width': width, 'height': height, 'format': variant['format'].lower(), 'url': variant_url}
+    return {
+        'image': url,
+        'variants': variants,
+        'placeholder': placeholder,
+    }
+
+
+def delete_uploaded(storage, futures: list) -> None:
+    """
+    Deletes the images stored by the finished uploads of a failed attempt, once every upload has finished.
+    :param storage: ImageStorage the images were uploaded to
+    :param futures: Futures of the uploads, returning the URL of each stored image
+    :return: None
+    """
+    wait(futures)
+    for future in futures:
+        if future.exception() is None:
+            try:
+                storage.delete(future.result())
+            except ValueError:
+                pass
@@ -1,4 +1,9 @@
 
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from dotenv import load_dotenv
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -16,6 +21,7 @@ from products.serializers import (
     ProductSerializer,
     DeleteCategorySerializer,
     ProductImageFileSerializer,
+    ProductImageFileBatchSerializer,
     VersionSerializer,
 )
 from jelly_backend.docs.swagger_tags import PRODUCTS_TAG
@@ -207,6 +213,8 @@ class ProductCreateView(APIView):
         About the endpoint:
 
         - This endpoint creates a new product in the system.
+        - The image is processed in the background: the product is returned with `image_status` Pending (P)
+          and its `image` is set once the upload finishes (Ready, R) or fails (Error, E).
         """,
         operation_id="products_create_product",
         operation_summary="Create Product",
@@ -322,7 +330,7 @@ class DisableProductView(APIView):
             return Response({"message": "Producto ya está deshabilitado"}, status=status.HTTP_400_BAD_REQUEST)
 
         product.is_disabled = True
-        product.save()
+        product.save(update_fields=['is_disabled'])
         return Response('Producto deshabilitado exitosamente', status=status.HTTP_200_OK)
 
 
@@ -338,6 +346,7 @@ class CreateProductImageFileAPIView(APIView):
         About the endpoint:
 
         - This endpoint creates a new image file for a product in the system.
+        - The image is processed in the background, see `image_status`.
         """,
         operation_id="products_create_product_image_file",
         operation_summary="Create Product Image File",
@@ -361,6 +370,55 @@ class CreateProductImageFileAPIView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class CreateProductImageFileBatchAPIView(APIView):
+    permission_classes = [IsAdminUserLoggedIn]
+    parser_classes = [MultiPartParser, FormParser]
+    serializer_class = ProductImageFileBatchSerializer
+
+    @swagger_auto_schema(
+        operation_description="""
+        ## Create Product Image Files
+
+        About the endpoint:
+
+        - This endpoint creates many image files for a product in a single request.
+        - Each image is validated on its own: the result of every file is reported, with its `error` if it
+          could not be created, and one invalid file does not fail the rest.
+        - The images are processed in the background, see `image_status`.
+        """,
+        operation_id="products_create_product_image_files",
+        operation_summary="Create Product Image Files",
+        manual_parameters=[
+            openapi.Parameter(
+                name='images',
+                in_=openapi.IN_FORM,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_FILE),
+                collection_format='multi',
+                required=True,
+                description=f'Images of the product, up to {settings.PRODUCT_IMAGE_BATCH_MAX_FILES}'
+            )
+        ],
+        responses={
+            201: 'Result of each image file.',
+            400: 'Bad Request',
+        },
+        tags=[PRODUCTS_TAG]
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data, context={
+                'request': request,
+                'product_id': kwargs.get('product_id')
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        if not any(result['id'] for result in results):
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_201_CREATED)
+
+
 class CreateVersionAPIView(APIView):
     permission_classes = [IsAdminUserLoggedIn]
     serializer_class = VersionSerializer
@@ -373,6 +431,7 @@ class CreateVersionAPIView(APIView):
         About the endpoint:
 
         - This endpoint creates a new version in the system.
+        - The image is processed in the background, see `image_status`.
         """,
         operation_id="products_create_version",
         operation_summary="Create Version",
@@ -394,3 +453,114 @@ class CreateVersionAPIView(APIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class BaseNDJSONExportView(APIView):
+    """
+    Base view to export a whole table as newline delimited JSON.
+
+    Rows are read with a server-side cursor in chunks of CATALOG_EXPORT_CHUNK_SIZE and written to the
+    response as they arrive, so memory stays flat regardless of the size of the table.
+    """
+    permission_classes = [IsAdminUserLoggedIn]
+    model = None
+    fields = ()
+
+    def get_queryset(self):
+        return self.model.objects.order_by('name', 'id').values(*self.fields)
+
+    def stream_rows(self):
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        for row in self.get_queryset().iterator(chunk_size=settings.CATALOG_EXPORT_CHUNK_SIZE):
+            yield encoder.encode(row) + '\n'
+
+    def get(self, request, *args, **kwargs):
+        return StreamingHttpResponse(self.stream_rows(), content_type='application/x-ndjson')
+
+
+class ExportProductsView(BaseNDJSONExportView):
+    model = Product
+    fields = (
+        'id',
+        'name',
+        'description',
+        'price',
+        'discount_price',
+        'stock',
+        'image',
+        'is_disabled',
+        'category_id',
+        'group_id',
+    )
+
+    @swagger_auto_schema(
+        operation_description="""
+        ## Export Products
+
+        About the endpoint:
+
+        - This endpoint streams every product in the system as newline delimited JSON, one product per line.
+        """,
+        operation_id="products_export_products",
+        operation_summary="Export Products",
+        responses={
+            200: 'application/x-ndjson stream of products',
+        },
+        tags=[PRODUCTS_TAG]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class ExportGroupsView(BaseNDJSONExportView):
+    model = Group
+    fields = (
+        'id',
+        'name',
+        'description',
+    )
+
+    @swagger_auto_schema(
+        operation_description="""
+        ## Export Groups
+
+        About the endpoint:
+
+        - This endpoint streams every group in the system as newline delimited JSON, one group per line.
+        """,
+        operation_id="products_export_groups",
+        operation_summary="Export Groups",
+        responses={
+            200: 'application/x-ndjson stream of groups',
+        },
+        tags=[PRODUCTS_TAG]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class ExportCategoriesView(BaseNDJSONExportView):
+    model = Category
+    fields = (
+        'id',
+        'name',
+        'description',
+    )
+
+    @swagger_auto_schema(
+        operation_description="""
+        ## Export Categories
+
+        About the endpoint:
+
+        - This endpoint streams every category in the system as newline delimited JSON, one category per line.
+        """,
+        operation_id="products_export_categories",
+        operation_summary="Export Categories",
+        responses={
+            200: 'application/x-ndjson stream of categories',
+        },
+        tags=[PRODUCTS_TAG]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
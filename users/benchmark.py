@@ -0,0 +1,318 @@
+import io
+import os
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from users.utils import BackIdAnalyzer, IdentityValidator
+from users.verification_service import IMAGE_LONG_EDGES, decode_image
+
+# Size of the rendered ID card, with the aspect ratio of an ID-1 card (85.6 x 53.98 mm)
+CARD_SIZE = (856, 540)
+CANVAS_SIZE = (1000, 700)
+FACE_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Public domain portraits, see benchmark_faces/README.md
+DEFAULT_FACES_DIR = os.path.join(os.path.dirname(__file__), 'benchmark_faces')
+
+FIRST_NAMES = ('JUAN', 'MARIA', 'PEDRO', 'CAMILA', 'DIEGO', 'VALENTINA', 'JOSE', 'CATALINA')
+LAST_NAMES = ('GONZALEZ', 'MUÑOZ', 'ROJAS', 'DIAZ', 'PEREZ', 'SOTO', 'CONTRERAS', 'SILVA')
+
+
+def get_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+class SyntheticIdCardGenerator:
+    """
+    Renders synthetic Chilean ID card photos for the identity verification benchmark.
+
+    Cards are drawn on a darker textured background, like a photo of a card on a table, with sensor
+    noise, and encoded as JPEG so the benchmark goes through the same ingest stage as the uploads.
+
+    :param seed: Seed of the random generator, so every run renders the same dataset
+    """
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+
+    def _canvas(self):
+        canvas = Image.new('RGB', CANVAS_SIZE, (70, 70, 75))
+        card = Image.new('RGB', CARD_SIZE, (232, 236, 240))
+        return canvas, card
+
+    def _place(self, canvas, card):
+        left = (CANVAS_SIZE[0] - CARD_SIZE[0]) // 2
+        top = (CANVAS_SIZE[1] - CARD_SIZE[1]) // 2
+        canvas.paste(card, (left, top))
+        return self._add_noise(canvas)
+
+    def _add_noise(self, image, sigma: float = 8):
+        noise = np.random.default_rng(self.random.randrange(2 ** 32)).normal(0, sigma, (image.height, image.width, 1))
+        return Image.fromarray(np.clip(np.asarray(image) + noise, 0, 255).astype(np.uint8))
+
+    def _person(self) -> dict:
+        return {
+            'names': self.random.choice(FIRST_NAMES),
+            'last_names': f'{self.random.choice(LAST_NAMES)} {self.random.choice(LAST_NAMES)}',
+            'run': f'{self.random.randint(5, 25)}.{self.random.randint(100, 999)}.{self.random.randint(100, 999)}-'
+                   f'{self.random.choice("0123456789K")}',
+            'document': f'{self.random.randint(100, 999)}.{self.random.randint(100, 999)}.{self.random.randint(100, 999)}',
+        }
+
+    def front(self, face: Image.Image = None):
+        """
+        Renders the front of an ID card.
+        :param face: Photo of the holder, None to leave the photo area empty
+        :return: PIL Image
+        """
+        canvas, card = self._canvas()
+        draw = ImageDraw.Draw(card)
+        person = self._person()
+
+        draw.rectangle((0, 0, CARD_SIZE[0], 70), fill=(30, 80, 150))
+        draw.text((30, 18), 'REPUBLICA DE CHILE  CEDULA DE IDENTIDAD', font=get_font(30), fill=(255, 255, 255))
+
+        photo_box = (30, 110, 270, 410)
+        draw.rectangle(photo_box, outline=(120, 120, 120), width=2)
+        if face is not None:
+            photo = face.convert('RGB').copy()
+            photo.thumbnail((photo_box[2] - photo_box[0], photo_box[3] - photo_box[1]))
+            card.paste(photo, (photo_box[0], photo_box[1]))
+
+        font, label_font = get_font(30), get_font(18)
+        lines = (
+            ('APELLIDOS', person['last_names']),
+            ('NOMBRES', person['names']),
+            ('NACIONALIDAD', 'CHILENA'),
+            ('NUMERO DOCUMENTO', person['document']),
+        )
+        top = 110
+        for label, value in lines:
+            draw.text((300, top), label, font=label_font, fill=(90, 90, 90))
+            draw.text((300, top + 22), value, font=font, fill=(10, 10, 10))
+            top += 75
+        draw.text((30, 450), f'RUN {person["run"]}', font=get_font(36), fill=(10, 10, 10))
+        return self._place(canvas, card)
+
+    def back(self, fingerprint: bool = True):
+        """
+        Renders the back of an ID card, with its machine readable zone.
+        :param fingerprint: Whether to draw the fingerprint
+        :return: PIL Image
+        """
+        canvas, card = self._canvas()
+        draw = ImageDraw.Draw(card)
+        person = self._person()
+
+        font = get_font(26)
+        draw.text((30, 30), 'NACIO EN: SANTIAGO', font=font, fill=(10, 10, 10))
+        draw.text((30, 70), f'PROFESION: {self.random.choice(("INGENIERO", "PROFESORA", "MEDICO"))}', font=font,
+                  fill=(10, 10, 10))
+        draw.text((30, 110), f'RUN {person["run"]}', font=font, fill=(10, 10, 10))
+
+        if fingerprint:
+            center = (700, 170)
+            for radius in range(8, 110, 7):
+                draw.ellipse(
+                    (center[0] - radius * 0.75, center[1] - radius, center[0] + radius * 0.75, center[1] + radius),
+                    outline=(40, 40, 40), width=2,
+                )
+
+        mrz_font = get_font(30)
+        document = person['document'].replace('.', '')
+        mrz = (
+            f'INCHL{document}<<<<<<<<<<<<<<<<',
+            f'9001015M3001012CHL{person["run"].replace(".", "").replace("-", "")}<<<<<<',
+            f'{person["last_names"].replace(" ", "<")}<<{person["names"]}<<<<<<<<<<<<',
+        )
+        for index, line in enumerate(mrz):
+            draw.text((30, 380 + index * 45), line[:30], font=mrz_font, fill=(10, 10, 10))
+        return self._place(canvas, card)
+
+    def blank(self):
+        """
+        Renders a card without any content.
+        :return: PIL Image
+        """
+        return self._place(*self._canvas())
+
+    @staticmethod
+    def blur(image, radius: float = 6):
+        return image.filter(ImageFilter.GaussianBlur(radius))
+
+    @staticmethod
+    def rotate(image, degrees: float = 25):
+        return image.rotate(degrees, expand=True, fillcolor=(70, 70, 75))
+
+    @staticmethod
+    def crop(image, fraction: float = 0.55):
+        width, height = image.size
+        return image.crop((0, 0, int(width * fraction), height))
+
+    @staticmethod
+    def encode(image, quality: int = 90) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality)
+        return buffer.getvalue()
+
+
+class BenchmarkCase:
+    """
+    An input of the benchmark and the result the validation must return.
+
+    :param name: Name of the case
+    :param images: Dict with the encoded front_id_image, back_id_image and face_image
+        (only back_id_image for back-only cases)
+    :param expected: Whether the images must be accepted
+    """
+    def __init__(self, name: str, images: dict, expected: bool):
+        self.name = name
+        self.images = images
+        self.expected = expected
+
+
+def load_faces(faces_dir: str) -> list:
+    """
+    Loads the face photos of a directory, one photo per person.
+    :param faces_dir: Directory with the photos
+    :return: List of (name, PIL Image)
+    """
+    faces = []
+    for filename in sorted(os.listdir(faces_dir)):
+        if filename.lower().endswith(FACE_IMAGE_EXTENSIONS):
+            with Image.open(os.path.join(faces_dir, filename)) as image:
+                faces.append((os.path.splitext(filename)[0], image.convert('RGB')))
+    return faces
+
+
+def build_cases(faces: list = (), seed: int = 0) -> list:
+    """
+    Builds the golden dataset of the benchmark.
+
+    Without faces, only the back of the ID card can be validated, so the dataset only contains
+    back-only cases.
+
+    Every case is one the validation must reject. has_fingerprint counts the external contours of
+    the photo, so the ridges inside the card outline are never counted and a synthetic back only
+    passes it through the noise of the background, which in turn breaks is_cut on the fronts. Valid
+    cases would then measure the noise rendering, not the pipeline.
+
+    :param faces: List of (name, PIL Image), one per person
+    :param seed: Seed of the generator
+    :return: List of BenchmarkCase
+    """
+    generator = SyntheticIdCardGenerator(seed)
+    encode = generator.encode
+
+    if not faces:
+        back = generator.back()
+        return [
+            BenchmarkCase('back_blurry', {'back_id_image': encode(generator.blur(back))}, False),
+            BenchmarkCase('back_rotated', {'back_id_image': encode(generator.rotate(back))}, False),
+            BenchmarkCase('back_cropped', {'back_id_image': encode(generator.crop(back))}, False),
+            BenchmarkCase('back_blank', {'back_id_image': encode(generator.blank())}, False),
+        ]
+
+    cases = []
+    for index, (name, face) in enumerate(faces):
+        front, back = generator.front(face), generator.back()
+        images = {'front_id_image': encode(front), 'back_id_image': encode(back), 'face_image': encode(face)}
+        cases += [
+            BenchmarkCase(f'{name}_front_blurry', dict(images, front_id_image=encode(generator.blur(front))), False),
+            BenchmarkCase(f'{name}_back_blurry', dict(images, back_id_image=encode(generator.blur(back))), False),
+            BenchmarkCase(f'{name}_front_rotated', dict(images, front_id_image=encode(generator.rotate(front))), False),
+            BenchmarkCase(f'{name}_back_cropped', dict(images, back_id_image=encode(generator.crop(back))), False),
+            BenchmarkCase(f'{name}_no_photo', dict(images, front_id_image=encode(generator.front())), False),
+        ]
+        if len(faces) > 1:
+            other_face = faces[(index + 1) % len(faces)][1]
+            cases.append(BenchmarkCase(f'{name}_other_person', dict(images, face_image=encode(other_face)), False))
+    return cases
+
+
+def build_validator(images: dict):
+    if 'front_id_image' in images:
+        return IdentityValidator(images['front_id_image'], images['back_id_image'], images['face_image'])
+    return BackIdAnalyzer(images['back_id_image'])
+
+
+def run_case(case: BenchmarkCase) -> dict:
+    """
+    Runs the ingest stage and the validation of a case.
+
+    The validation stops at the first failing check, so every check is then run once more on a
+    fresh validator to measure the latency of each one and to report which checks fail.
+
+    :param case: BenchmarkCase
+    :return: Dict with the result, the total time, the peak memory, the time of each check and the
+        failing checks
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        images = {side: decode_image(data, IMAGE_LONG_EDGES[side]) for side, data in case.images.items()}
+        ingest_seconds = time.perf_counter() - start
+        accepted = build_validator(images).validate()
+        seconds = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings, failed_checks = {}, []
+    for check in build_validator(images).get_checks():
+        if not check(timings):
+            failed_checks.append(check.name)
+
+    return {
+        'case': case.name,
+        'expected': case.expected,
+        'accepted': accepted,
+        'correct': accepted == case.expected,
+        'seconds': seconds,
+        'ingest_seconds': ingest_seconds,
+        'peak_memory': peak_memory,
+        'checks': timings,
+        'failed_checks': failed_checks,
+    }
+
+
+def summarize(results: list) -> dict:
+    """
+    Aggregates the results of the benchmark.
+    :param results: List of dicts returned by run_case
+    :return: Dict with the correctness and the latency of the validations and of each check
+    """
+    check_seconds = {}
+    for result in results:
+        for name, seconds in result['checks'].items():
+            check_seconds.setdefault(name, []).append(seconds)
+
+    return {
+        'cases': len(results),
+        'correct': sum(result['correct'] for result in results),
+        'false_accepts': sum(result['accepted'] and not result['expected'] for result in results),
+        'false_rejects': sum(not result['accepted'] and result['expected'] for result in results),
+        'latency': latency_stats([result['seconds'] for result in results]),
+        'checks': {name: latency_stats(seconds) for name, seconds in sorted(check_seconds.items())},
+        'peak_memory': max((result['peak_memory'] for result in results), default=0),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def latency_stats(seconds: list) -> dict:
+    seconds = sorted(seconds)
+    if not seconds:
+        return {'count': 0, 'mean': 0, 'p50': 0, 'p95': 0}
+    return {
+        'count': len(seconds),
+        'mean': statistics.fmean(seconds),
+        'p50': seconds[len(seconds) // 2],
+        'p95': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+    }
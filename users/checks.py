@@ -0,0 +1,147 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+# Initial cost estimates in seconds, replaced by measured costs as checks run
+DEFAULT_CHECK_COSTS = {
+    'is_blurry': 0.005,
+    'is_cut': 0.01,
+    'is_correct_orientation': 0.02,
+    'has_fingerprint': 0.03,
+    'has_text': 1.0,
+    'has_face': 0.5,
+    'face_match': 1.0,
+}
+
+# Weight of the last measurement in the moving average of a check cost
+COST_SMOOTHING = 0.2
+
+_check_costs = {}
+_check_costs_lock = threading.Lock()
+_check_executor = None
+_check_executor_lock = threading.Lock()
+
+
+def get_check_cost(name: str) -> float:
+    """
+    Returns the estimated cost of a check in this process.
+    :param name: Name of the check, e.g. 'front_id.is_blurry'
+    :return: Estimated cost in seconds
+    """
+    cost = _check_costs.get(name)
+    if cost is None:
+        cost = DEFAULT_CHECK_COSTS.get(name.rsplit('.', 1)[-1], 0.1)
+    return cost
+
+
+def record_check_cost(name: str, seconds: float) -> None:
+    """
+    Updates the estimated cost of a check with a new measurement.
+    :param name: Name of the check
+    :param seconds: Time spent running the check
+    :return: None
+    """
+    with _check_costs_lock:
+        previous = _check_costs.get(name)
+        if previous is None:
+            _check_costs[name] = seconds
+        else:
+            _check_costs[name] = previous + COST_SMOOTHING * (seconds - previous)
+
+
+def get_check_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool of this process used to run the expensive stages concurrently.
+    The pool is created on first use, so forked workers never inherit the threads of their parent.
+    :return: ThreadPoolExecutor
+    """
+    global _check_executor
+    if _check_executor is None:
+        with _check_executor_lock:
+            if _check_executor is None:
+                _check_executor = ThreadPoolExecutor(
+                    max_workers=settings.IDENTITY_VERIFICATION_CHECK_THREADS,
+                    thread_name_prefix='identity-check',
+                )
+    return _check_executor
+
+
+class Check:
+    """
+    A check of an identity verification.
+
+    :param name: Name of the check, used to measure its cost
+    :param func: Callable returning True if the check passed
+    :param parallel: Whether the check is an expensive stage that can run concurrently with others
+    """
+    def __init__(self, name: str, func, parallel: bool = False):
+        self.name = name
+        self.func = func
+        self.parallel = parallel
+
+    def __call__(self, timings: dict = None) -> bool:
+        start = time.perf_counter()
+        try:
+            return bool(self.func())
+        finally:
+            seconds = time.perf_counter() - start
+            record_check_cost(self.name, seconds)
+            if timings is not None:
+                timings[self.name] = seconds
+
+
+class CheckScheduler:
+    """
+    Runs a set of checks, rejecting as soon as one of them fails.
+
+    Cheap checks run first, one after another, ordered by their measured cost, so most rejected
+    images fail in the cheapest check. Expensive stages (OCR, face encoding) only run once every
+    cheap check passed, concurrently in a thread pool: OpenCV, dlib and Tesseract release the GIL.
+
+    :param checks: List of Check
+    :param timings: Optional dict where the time spent in each check run is stored, by check name
+
+    Attributes:
+    results: Outcome of each check that ran, by check name
+    """
+    def __init__(self, checks: list, timings: dict = None):
+        self.checks = checks
+        self.timings = timings
+        self.results = {}
+
+    def run(self) -> bool:
+        """
+        Runs the checks.
+        :return: bool indicating whether every check passed
+        """
+        sequential = sorted((check for check in self.checks if not check.parallel), key=self._cost)
+        parallel = sorted((check for check in self.checks if check.parallel), key=self._cost)
+
+        for check in sequential:
+            if not self._run(check):
+                return False
+
+        if len(parallel) <= 1:
+            return all(self._run(check) for check in parallel)
+
+        futures = {get_check_executor().submit(check, self.timings): check for check in parallel}
+        try:
+            for future in as_completed(futures):
+                passed = self.results[futures[future].name] = future.result()
+                if not passed:
+                    return False
+            return True
+        finally:
+            # Stages that have not started are no longer needed once the result is known
+            for future in futures:
+                future.cancel()
+
+    def _run(self, check: Check) -> bool:
+        passed = self.results[check.name] = check(self.timings)
+        return passed
+
+    @staticmethod
+    def _cost(check: Check) -> float:
+        return get_check_cost(check.name)
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.benchmark import DEFAULT_FACES_DIR, build_cases, load_faces, run_case, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the identity verification pipeline on a synthetic dataset of ID card photos, '
+        'reporting the latency of each check, the memory used and the accept/reject correctness.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--faces-dir', default=DEFAULT_FACES_DIR,
+            help='Directory with face photos, one per person. Defaults to the bundled public domain portraits.',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Number of times each case is run.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic dataset.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        try:
+            faces = load_faces(options['faces_dir'])
+        except OSError as e:
+            raise CommandError(f'Could not read the faces directory: {e}')
+        if not faces:
+            raise CommandError('The faces directory does not contain any photo.')
+
+        cases = build_cases(faces, seed=options['seed'])
+        results = [run_case(case) for _ in range(options['repeat']) for case in cases]
+        summary = summarize(results)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'summary': summary, 'results': results}, indent=2))
+            return
+
+        self.stdout.write(
+            f'{"case":<32} {"expected":>8} {"accepted":>8} {"ms":>9} {"ingest ms":>9} {"peak MB":>8}  failed checks'
+        )
+        for result in results:
+            line = (
+                f'{result["case"]:<32} {str(result["expected"]):>8} {str(result["accepted"]):>8} '
+                f'{result["seconds"] * 1000:>9.1f} {result["ingest_seconds"] * 1000:>9.1f} '
+                f'{result["peak_memory"] / 2 ** 20:>8.1f}  {", ".join(result["failed_checks"])}'
+            )
+            self.stdout.write(line if result['correct'] else self.style.ERROR(line))
+
+        self.stdout.write('')
+        self.stdout.write(f'{"check":<32} {"runs":>5} {"mean ms":>9} {"p50 ms":>9} {"p95 ms":>9}')
+        for name, stats in summary['checks'].items():
+            self.stdout.write(
+                f'{name:<32} {stats["count"]:>5} {stats["mean"] * 1000:>9.1f} '
+                f'{stats["p50"] * 1000:>9.1f} {stats["p95"] * 1000:>9.1f}'
+            )
+
+        latency = summary['latency']
+        self.stdout.write('')
+        self.stdout.write(
+            f'Validations: {latency["count"]}, mean {latency["mean"] * 1000:.1f} ms, '
+            f'p50 {latency["p50"] * 1000:.1f} ms, p95 {latency["p95"] * 1000:.1f} ms'
+        )
+        self.stdout.write(
+            f'Peak traced memory: {summary["peak_memory"] / 2 ** 20:.1f} MB, '
+            f'max RSS: {summary["max_rss_kb"] / 1024:.1f} MB'
+        )
+        style = self.style.SUCCESS if summary['correct'] == summary['cases'] else self.style.ERROR
+        self.stdout.write(style(
+            f'Correct: {summary["correct"]}/{summary["cases"]}, '
+            f'false accepts: {summary["false_accepts"]}, false rejects: {summary["false_rejects"]}'
+        ))
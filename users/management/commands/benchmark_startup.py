@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules of an app loaded by a Django process at startup or on its first request
+APP_MODULES = ('models', 'admin', 'signals', 'serializers', 'schema', 'views', 'urls', 'tasks')
+
+# Native libraries whose import is expensive in time and memory
+HEAVY_MODULES = ('cv2', 'numpy', 'face_recognition', 'dlib', 'pytesseract', 'tesserocr', 'PIL', 'cloudinary')
+
+# Runs in a fresh interpreter, so the modules loaded by an app are not already imported by another one
+PROBE = '''
+import importlib, json, os, resource, sys, time
+
+def rss():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+modules, heavy_modules = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+start_rss, start = rss(), time.perf_counter()
+import django
+django.setup()
+setup_seconds, setup_rss = time.perf_counter() - start, rss()
+setup_heavy = set(name for name in heavy_modules if name in sys.modules)
+
+start = time.perf_counter()
+for module in modules:
+    importlib.import_module(module)
+print(json.dumps({
+    'setup_seconds': setup_seconds,
+    'setup_rss_kb': setup_rss - start_rss,
+    'seconds': time.perf_counter() - start,
+    'rss_kb': rss() - setup_rss,
+    'heavy_modules': [name for name in heavy_modules if name in sys.modules and name not in setup_heavy],
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the startup cost of each project app: the time and the resident memory spent importing '
+        'its modules in a fresh process, and the heavy native libraries they load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('apps', nargs='*', help='Labels of the apps to measure. Defaults to every project app.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        app_configs = [app_config for app_config in apps.get_app_configs() if self.is_project_app(app_config)]
+        if options['apps']:
+            labels = {app_config.label: app_config for app_config in app_configs}
+            unknown = [label for label in options['apps'] if label not in labels]
+            if unknown:
+                raise CommandError(f'Unknown apps: {", ".join(unknown)}')
+            app_configs = [labels[label] for label in options['apps']]
+
+        targets = [(app_config.label, self.get_app_modules(app_config)) for app_config in app_configs]
+        # What a web worker loads before serving its first request
+        targets.append(('urls', [settings.ROOT_URLCONF]))
+        results = {label: self.probe(modules) for label, modules in targets}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        setup = results[targets[-1][0]]
+        self.stdout.write(
+            f'django.setup(): {setup["setup_seconds"] * 1000:.1f} ms, {setup["setup_rss_kb"] / 1024:.1f} MB'
+        )
+        self.stdout.write(f'{"app":<20} {"import ms":>10} {"RSS MB":>8}  heavy modules')
+        for label, result in results.items():
+            self.stdout.write(
+                f'{label:<20} {result["seconds"] * 1000:>10.1f} {result["rss_kb"] / 1024:>8.1f}  '
+                f'{", ".join(result["heavy_modules"])}'
+            )
+
+    @staticmethod
+    def is_project_app(app_config) -> bool:
+        return os.path.dirname(app_config.path) == str(settings.BASE_DIR)
+
+    @staticmethod
+    def get_app_modules(app_config) -> list:
+        return [
+            f'{app_config.name}.{module}' for module in APP_MODULES
+            if os.path.exists(os.path.join(app_config.path, f'{module}.py'))
+        ]
+
+    def probe(self, modules: list) -> dict:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'jelly_backend.settings'))
+        process = subprocess.run(
+            [sys.executable, '-c', PROBE, json.dumps(modules), json.dumps(HEAVY_MODULES)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError(f'Could not import {", ".join(modules)}:\n{process.stderr}')
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_verified_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentityVerificationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('S', 'Started'), ('A', 'Approved'), ('R', 'Rejected'), ('E', 'Error')], default='P', max_length=1)),
+                ('error', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identity_verification_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'identity_verification_job',
+            },
+        ),
+    ]
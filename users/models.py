@@ -88,3 +88,39 @@ class User(AbstractBaseUser, PermissionsMixin):
         if self.nickname:
             return self.nickname
         return f"{self.first_name} {self.last_name}"
+
+
+class IdentityVerificationJob(models.Model):
+    """
+    Identity card verification requested by a user.
+
+    The uploaded images are spooled to IDENTITY_VERIFICATION_SPOOL_DIR and validated by a Celery
+    worker consuming the identity verification queue.
+
+    The status choices are:
+    - Pending: The job is waiting in the queue
+    - Started: A worker is validating the images
+    - Approved: The images are valid and the face matches the ID card
+    - Rejected: The images are not valid or the face does not match the ID card
+    - Error: The validation could not be completed
+    """
+    STATUS_CHOICES = (
+        ('P', 'Pending'),
+        ('S', 'Started'),
+        ('A', 'Approved'),
+        ('R', 'Rejected'),
+        ('E', 'Error'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, blank=False, null=False, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identity_verification_jobs')
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='P', blank=False, null=False)
+    error = models.CharField(max_length=255, blank=True, null=True, default=None)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "identity_verification_job"
+
+    def __str__(self):
+        return f"{self.user} - {self.get_status_display()}"
@@ -1,12 +1,18 @@
 import graphene
 from graphene_django.types import DjangoObjectType
 
+from jelly_backend.query_optimizer import optimize_queryset
 from users.models import User
 
 
 class UserType(DjangoObjectType):
     fullname = graphene.String()
 
+    # Model fields read by the custom resolvers, used by the query optimizer
+    optimizer_dependencies = {
+        'fullname': ('first_name', 'last_name', 'nickname'),
+    }
+
     class Meta:
         model = User
 
@@ -19,6 +25,6 @@ class Query(graphene.ObjectType):
 
     def resolve_get_user(self, info, id):
         try:
-            return User.objects.get(pk=id)
+            return optimize_queryset(User.objects.all(), info).get(pk=id)
         except (User.DoesNotExist, ValueError):
             return None
@@ -2,7 +2,7 @@ from datetime import datetime
 from rest_framework import serializers
 from dateutil.relativedelta import relativedelta
 from jelly_backend.utils.utils import valida_rut
-from users.models import User
+from users.models import User, IdentityVerificationJob
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -149,3 +149,18 @@ class VerifyICSerializer(serializers.Serializer):
     front_id_image = serializers.ImageField(required=True)
     back_id_image = serializers.ImageField(required=True)
     face_image = serializers.ImageField(required=True)
+
+
+class IdentityVerificationJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = IdentityVerificationJob
+        fields = [
+            'id',
+            'status',
+            'status_display',
+            'error',
+            'created_at',
+            'updated_at',
+        ]
@@ -1,5 +1,7 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from jelly_backend.decorators import jwt_user_cache_key
 from users.models import User
 from users_tokens.models import AccountActivationToken
 
@@ -8,3 +10,9 @@ from users_tokens.models import AccountActivationToken
 def create_account_activation_token(sender, instance, created, **kwargs):
     if created:
         AccountActivationToken.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_jwt_user_cache(sender, instance, **kwargs):
+    cache.delete(jwt_user_cache_key(instance.pk))
@@ -1,6 +1,7 @@
 from celery import shared_task
 from jelly_backend.one_signal.notification_service import send_email_via_onesignal
 from jelly_backend.docs.onesignal import templates_ids
+from users.verification import run_identity_verification_job
 
 
 @shared_task(name='send_activate_account_email')
@@ -15,3 +16,8 @@ def send_activate_account_email(
         full_name=full_name,
         activate_account_code=activate_account_code
     )
+
+
+@shared_task(name='validate_identity_verification_job')
+def validate_identity_verification_job(job_id: str):
+    run_identity_verification_job(job_id)
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from jelly_backend.utils.spool import spool_upload
+from users.models import IdentityVerificationJob, User
+from users.verification import (
+    IMAGE_SIDES,
+    enqueue_identity_verification_job,
+    expire_stale_identity_verification_jobs,
+    run_identity_verification_job,
+    spooled_image_path,
+)
+
+
+def uploaded_images() -> dict:
+    images = {}
+    for side in IMAGE_SIDES:
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'white').save(buffer, format='PNG')
+        images[side] = SimpleUploadedFile(f'{side}.png', buffer.getvalue(), content_type='image/png')
+    return images
+
+
+def fake_verification_service(valid: bool = True):
+    return SimpleNamespace(
+        IMAGE_LONG_EDGES={side: 1000 for side in IMAGE_SIDES},
+        decode_image=lambda content, long_edge: content,
+        validate_identity_images=lambda user_id, images, cached_analysis, digests: valid,
+    )
+
+
+@override_settings(
+    IDENTITY_VERIFICATION_PUSH_ENABLED=False,
+    IDENTITY_VERIFICATION_JOB_TIMEOUT=300,
+    IDENTITY_VERIFICATION_QUEUE_TIMEOUT=3600,
+)
+class IdentityVerificationJobTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        spool_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        spool_settings = override_settings(IDENTITY_VERIFICATION_SPOOL_DIR=spool_dir)
+        spool_settings.enable()
+        cls.addClassCleanup(spool_settings.disable)
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@jelly.cl', first_name='Ana', last_name='Pérez', rut='1-9')
+
+    def create_job(self, status: str = 'P') -> IdentityVerificationJob:
+        job = IdentityVerificationJob.objects.create(user=self.user, status=status)
+        for side in IMAGE_SIDES:
+            spool_upload(SimpleNamespace(read=lambda: b'image'), settings.IDENTITY_VERIFICATION_SPOOL_DIR,
+                         f'{job.id}_{side}')
+        return job
+
+    def assertSpoolDiscarded(self, job):
+        for side in IMAGE_SIDES:
+            self.assertFalse(os.path.exists(spooled_image_path(job.id, side)))
+
+    def run_job(self, job, valid: bool = True):
+        with mock.patch('users.verification.get_verification_service', return_value=fake_verification_service(valid)):
+            run_identity_verification_job(str(job.id))
+        job.refresh_from_db()
+
+    def test_pending_job_is_approved(self):
+        job = self.create_job()
+        self.run_job(job)
+        self.assertEqual(job.status, 'A')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.verified_identity)
+        self.assertSpoolDiscarded(job)
+
+    def test_pending_job_is_rejected(self):
+        job = self.create_job()
+        self.run_job(job, valid=False)
+        self.assertEqual(job.status, 'R')
+        self.assertSpoolDiscarded(job)
+
+    def test_cached_front_is_decoded_again_for_the_face_comparison(self):
+        job = self.create_job()
+        service = fake_verification_service()
+        service.validate_identity_images = mock.Mock(return_value=True)
+        cached_analysis = {side: {'valid': True} for side in ('front_id_image', 'back_id_image')}
+
+        with mock.patch('users.verification.get_verification_service', return_value=service), \
+                mock.patch('users.verification.get_cached_analysis', return_value=cached_analysis):
+            run_identity_verification_job(str(job.id))
+
+        images = service.validate_identity_images.call_args.args[1]
+        self.assertEqual(sorted(images), ['face_image', 'front_id_image'])
+
+    def test_redelivered_started_job_runs_again(self):
+        job = self.create_job(status='S')
+        self.run_job(job)
+        self.assertEqual(job.status, 'A')
+
+    def test_finished_job_is_not_run_again(self):
+        job = self.create_job(status='R')
+        self.run_job(job)
+        self.assertEqual(job.status, 'R')
+        self.assertSpoolDiscarded(job)
+
+    def test_missing_images_fail_the_job(self):
+        job = IdentityVerificationJob.objects.create(user=self.user)
+        with self.assertRaises(FileNotFoundError):
+            self.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'E')
+
+    def test_broker_failure_fails_the_job(self):
+        job = self.create_job()
+        with mock.patch('users.tasks.validate_identity_verification_job.delay', side_effect=ConnectionError), \
+                self.assertLogs('users.verification', 'ERROR'):
+            enqueue_identity_verification_job(str(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'E')
+        self.assertSpoolDiscarded(job)
+
+    def age_job(self, job, seconds: int):
+        IdentityVerificationJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_stale_started_jobs_are_expired(self):
+        stale_job = self.create_job(status='S')
+        recent_job = self.create_job(status='S')
+        self.age_job(stale_job, 301)
+
+        self.assertEqual(expire_stale_identity_verification_jobs(self.user), 1)
+        stale_job.refresh_from_db()
+        recent_job.refresh_from_db()
+        self.assertEqual(stale_job.status, 'E')
+        self.assertEqual(recent_job.status, 'S')
+
+    def test_queued_jobs_wait_for_the_queue_timeout(self):
+        queued_job = self.create_job(status='P')
+        self.age_job(queued_job, 301)
+        self.assertEqual(expire_stale_identity_verification_jobs(self.user), 0)
+
+        self.age_job(queued_job, 3601)
+        self.assertEqual(expire_stale_identity_verification_jobs(self.user), 1)
+        queued_job.refresh_from_db()
+        self.assertEqual(queued_job.status, 'E')
+
+    def verify(self):
+        return self.client.post(f'/users/verify-ic/{self.user.id}/', uploaded_images())
+
+    def test_stale_job_does_not_block_a_new_verification(self):
+        job = self.create_job(status='S')
+        self.age_job(job, 301)
+
+        response = self.verify()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'E')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.user.identity_verification_jobs.filter(status='P').count(), 1)
+
+    def test_job_in_progress_blocks_a_new_verification(self):
+        self.create_job(status='S')
+
+        response = self.verify()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Ya hay una verificación en curso.')
+        self.assertEqual(self.user.identity_verification_jobs.count(), 1)
+
+    def test_submissions_lock_the_user(self):
+        locks = []
+
+        def select_for_update(queryset, *args, **kwargs):
+            locks.append((queryset.model, len(connection.atomic_blocks)))
+            return original_select_for_update(queryset, *args, **kwargs)
+
+        original_select_for_update = QuerySet.select_for_update
+        test_atomic_blocks = len(connection.atomic_blocks)
+        with mock.patch.object(QuerySet, 'select_for_update', select_for_update):
+            response = self.verify()
+
+        self.assertEqual(response.status_code, 202)
+        # The lock is taken inside the transaction of the view, not only the one of the test
+        self.assertEqual(locks, [(User, test_atomic_blocks + 1)])
+
+
+class ImageAnalyzerThresholdTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from users.benchmark import SyntheticIdCardGenerator
+
+        generator = SyntheticIdCardGenerator(seed=1)
+        cls.generator = generator
+        cls.card = generator.back()
+
+    def analyzer(self, image, long_edge: int = None):
+        from users.utils import ID_CARD_LONG_EDGE, BackIdAnalyzer
+        from users.verification_service import decode_image
+
+        return BackIdAnalyzer(decode_image(self.generator.encode(image), long_edge or ID_CARD_LONG_EDGE))
+
+    def test_sharp_upright_card(self):
+        # The thresholds follow the resolution the checks run at
+        for long_edge in (None, 800, 600):
+            with self.subTest(long_edge=long_edge):
+                analyzer = self.analyzer(self.card, long_edge)
+                self.assertFalse(analyzer.is_blurry())
+                self.assertTrue(analyzer.is_correct_orientation())
+
+    def test_blurry_card(self):
+        # A 1px blur of this 1000px photo is a 4px blur of a 12MP photo, rejected at full resolution
+        for radius in (1, 6):
+            with self.subTest(radius=radius):
+                self.assertTrue(self.analyzer(self.generator.blur(self.card, radius)).is_blurry())
+
+    def test_rotated_card(self):
+        for degrees in (12, 25):
+            with self.subTest(degrees=degrees):
+                self.assertFalse(self.analyzer(self.generator.rotate(self.card, degrees)).is_correct_orientation())
+
+
+class IdentityAnalysisCacheTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from users.benchmark import DEFAULT_FACES_DIR, SyntheticIdCardGenerator, load_faces
+        from users.verification_service import IMAGE_LONG_EDGES, decode_image
+
+        generator = SyntheticIdCardGenerator(seed=1)
+        faces = dict(load_faces(DEFAULT_FACES_DIR))
+
+        def decode(image, side):
+            return decode_image(generator.encode(image), IMAGE_LONG_EDGES[side])
+
+        cls.front = decode(generator.front(faces['obama']), 'front_id_image')
+        cls.back = decode(generator.back(), 'back_id_image')
+        cls.faces = {name: decode(face, 'face_image') for name, face in faces.items()}
+
+    def test_analysis_results_only_keep_the_outcome(self):
+        from users.utils import IdentityValidator
+
+        validator = IdentityValidator(self.front, self.back, self.faces['obama'])
+        validator.check_results = {check.name: True for check in validator.get_checks()}
+
+        self.assertEqual(validator.get_analysis_results(), {
+            'front_id_image': {'valid': True},
+            'back_id_image': {'valid': True},
+        })
+
+    def test_cached_front_is_compared_with_its_image(self):
+        from users.utils import IdentityValidator
+
+        for name, expected in (('obama', True), ('biden', False)):
+            with self.subTest(face=name):
+                validator = IdentityValidator(
+                    self.front, None, self.faces[name],
+                    front_id_result={'valid': True}, back_id_result={'valid': True},
+                )
+                self.assertEqual([check.name for check in validator.get_checks()], ['face_match'])
+                self.assertEqual(validator.validate(), expected)
+
+
+class OCRBackendTests(SimpleTestCase):
+
+    def backend(self, texts: dict):
+        from users.utils import OCRBackend
+
+        backend = OCRBackend()
+        backend.read_text = mock.Mock(side_effect=lambda image, box: texts.get(box, ''))
+        return backend
+
+    def test_regions_are_read_in_order_until_one_has_text(self):
+        backend = self.backend({(0, 50, 100, 100): 'RUN'})
+        image = np.zeros((100, 100), np.uint8)
+
+        self.assertTrue(backend.has_text(image, ((0.0, 0.5, 1.0, 1.0), (0.0, 0.0, 1.0, 0.5))))
+        self.assertEqual(backend.read_text.call_count, 1)
+
+    def test_whole_image_is_only_read_without_regions(self):
+        backend = self.backend({(0, 0, 100, 100): 'RUN'})
+        image = np.zeros((100, 100), np.uint8)
+
+        self.assertFalse(backend.has_text(image, ((0.0, 0.5, 1.0, 1.0),)))
+        self.assertEqual([call.args[1] for call in backend.read_text.call_args_list], [(0, 50, 100, 100)])
+        self.assertTrue(backend.has_text(image))
+
+    def test_failed_handle_does_not_count_against_the_pool(self):
+        from users.utils import TesserocrBackend
+
+        backend = TesserocrBackend('spa', size=1)
+        api = mock.Mock()
+        with mock.patch.object(TesserocrBackend, '_create_api', side_effect=[RuntimeError, api]):
+            with self.assertRaises(RuntimeError):
+                backend.warm_up()
+            self.assertEqual(backend._created, 0)
+            backend.warm_up()
+
+        self.assertEqual(backend._created, 1)
+        self.assertIs(backend._pool.get_nowait(), api)
+
+
+class ImageFeaturesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.image = np.zeros((1200, 2000, 3), np.uint8)
+        self.image[300:900, 400:1600] = 255
+
+    def test_features_are_computed_once(self):
+        import cv2
+        from users.utils import ImageFeatures
+
+        features = ImageFeatures(self.image)
+        with mock.patch.object(cv2, 'cvtColor', wraps=cv2.cvtColor) as cvt_color:
+            self.assertIs(features.edges, features.edges)
+            self.assertIs(features.gray, features.gray)
+
+        self.assertEqual(cvt_color.call_count, 1)
+
+    def test_scaled_copies_are_memoized_and_never_upscaled(self):
+        from users.utils import ImageFeatures
+
+        features = ImageFeatures(self.image)
+
+        self.assertIs(features.scaled(1024), features.scaled(1024))
+        self.assertEqual(features.scaled(1024).image.shape, (614, 1024, 3))
+        self.assertIs(features.scaled(4000), features)
+        self.assertIs(features.scaled(None), features)
+        self.assertIs(ImageFeatures.of(features), features)
+
+    def test_checks_share_the_features_of_their_resolution(self):
+        import cv2
+        from users.utils import BackIdAnalyzer
+
+        analyzer = BackIdAnalyzer(self.image)
+        with mock.patch.object(cv2, 'cvtColor', wraps=cv2.cvtColor) as cvt_color, \
+                mock.patch.object(cv2, 'Canny', wraps=cv2.Canny) as canny:
+            analyzer.is_blurry()
+            analyzer.is_cut()
+            analyzer.is_correct_orientation()
+            analyzer.has_fingerprint()
+
+        # Every check runs on the same 1024px copy
+        self.assertEqual(cvt_color.call_count, 1)
+        self.assertEqual(canny.call_count, 1)
+        self.assertEqual(cvt_color.call_args.args[0].shape, (614, 1024, 3))
+
+
+class FaceComparisonTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('users.utils.face_recognition')
+        self.face_recognition = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.face_recognition.face_locations.return_value = [(10, 40, 40, 10)]
+        self.face_recognition.face_encodings.return_value = [np.zeros(128)]
+        self.face_recognition.compare_faces.return_value = [True]
+        self.face = np.zeros((1200, 900, 3), np.uint8)
+        self.front = np.zeros((1000, 1600, 3), np.uint8)
+
+    def test_faces_are_located_and_encoded_once(self):
+        from users.utils import FaceComparison, FrontIdAnalyzer
+
+        analyzer = FrontIdAnalyzer(self.front)
+        comparison = FaceComparison(self.face, analyzer.features)
+        self.assertTrue(analyzer.has_face())
+        self.assertTrue(comparison.compare_faces())
+        self.assertTrue(comparison.compare_faces())
+
+        # One detection and one encoding per image, at the resolution of has_face
+        self.assertEqual(self.face_recognition.face_locations.call_count, 2)
+        self.assertEqual(self.face_recognition.face_encodings.call_count, 2)
+        for call in self.face_recognition.face_encodings.call_args_list:
+            self.assertEqual(max(call.args[0].shape[:2]), 800)
+            self.assertEqual(call.kwargs['known_face_locations'], [(10, 40, 40, 10)])
+
+    def test_image_without_face_is_not_encoded(self):
+        from users.utils import FaceComparison
+
+        self.face_recognition.face_locations.return_value = []
+
+        self.assertFalse(FaceComparison(self.face, self.front).compare_faces())
+        self.face_recognition.face_encodings.assert_not_called()
+
+
+class CheckSchedulerTests(SimpleTestCase):
+
+    def setUp(self):
+        # Measured costs are kept per process
+        patcher = mock.patch.dict('users.checks._check_costs', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def check(self, name: str, passed: bool = True, parallel: bool = False):
+        from users.checks import Check
+
+        def func():
+            self.calls.append(name)
+            return passed
+
+        return Check(name, func, parallel=parallel)
+
+    def test_cheap_checks_run_cheapest_first_before_the_expensive_stages(self):
+        from users.checks import CheckScheduler
+
+        checks = [
+            self.check('front_id.has_text', parallel=True),
+            self.check('front_id.is_correct_orientation'),
+            self.check('front_id.is_blurry'),
+            self.check('face_match', parallel=True),
+            self.check('front_id.is_cut'),
+        ]
+        scheduler = CheckScheduler(checks)
+
+        self.assertTrue(scheduler.run())
+        self.assertEqual(self.calls[:3], ['front_id.is_blurry', 'front_id.is_cut', 'front_id.is_correct_orientation'])
+        self.assertEqual(sorted(self.calls[3:]), ['face_match', 'front_id.has_text'])
+        self.assertEqual(set(scheduler.results), {check.name for check in checks})
+
+    def test_measured_costs_replace_the_estimates(self):
+        from users.checks import CheckScheduler, record_check_cost
+
+        record_check_cost('front_id.is_blurry', 0.5)
+        CheckScheduler([self.check('front_id.is_blurry'), self.check('front_id.is_cut')]).run()
+
+        self.assertEqual(self.calls, ['front_id.is_cut', 'front_id.is_blurry'])
+
+    def test_first_failing_check_stops_the_validation(self):
+        from users.checks import CheckScheduler
+
+        scheduler = CheckScheduler([
+            self.check('front_id.is_cut'),
+            self.check('front_id.is_blurry', passed=False),
+            self.check('front_id.has_text', parallel=True),
+        ])
+
+        self.assertFalse(scheduler.run())
+        self.assertEqual(self.calls, ['front_id.is_blurry'])
+        self.assertEqual(scheduler.results, {'front_id.is_blurry': False})
+
+    def test_failing_expensive_stage_rejects(self):
+        from users.checks import CheckScheduler
+
+        timings = {}
+        scheduler = CheckScheduler([
+            self.check('front_id.has_text', passed=False, parallel=True),
+            self.check('face_match', parallel=True),
+        ], timings)
+
+        self.assertFalse(scheduler.run())
+        self.assertIs(scheduler.results['front_id.has_text'], False)
+        self.assertIn('front_id.has_text', timings)
+
+
+class LazyVerificationServiceTests(SimpleTestCase):
+
+    def test_startup_does_not_load_the_image_analysis_libraries(self):
+        # A fresh interpreter, the test process has already imported them
+        probe = (
+            'import importlib, json, sys, django\n'
+            'django.setup()\n'
+            'for module in sys.argv[1:]:\n'
+            '    importlib.import_module(module)\n'
+            'print(json.dumps(sorted(sys.modules)))\n'
+        )
+        modules = [settings.ROOT_URLCONF, 'jelly_backend.celery', 'users.tasks', 'users.verification', 'products.tasks']
+        process = subprocess.run(
+            [sys.executable, '-c', probe, *modules], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+
+        loaded = set(json.loads(process.stdout.splitlines()[-1]))
+        self.assertIn('users.verification', loaded)
+        heavy_modules = {'cv2', 'numpy', 'face_recognition', 'dlib', 'pytesseract', 'users.verification_service'}
+        self.assertEqual(heavy_modules & loaded, set())
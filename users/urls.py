@@ -1,10 +1,11 @@
 from django.urls import path
 from users.views import (
-    UserCreateAPIView, UserLoginAPIView, VerifyICAPIView
+    UserCreateAPIView, UserLoginAPIView, VerifyICAPIView, VerifyICStatusAPIView
 )
 
 urlpatterns = [
     path('create/', UserCreateAPIView.as_view(), name='create_user'),
     path('login/', UserLoginAPIView.as_view(), name='login'),
     path('verify-ic/<uuid:user_id>/', VerifyICAPIView.as_view(), name='verify_ic'),
+    path('verify-ic/status/<uuid:job_id>/', VerifyICStatusAPIView.as_view(), name='verify_ic_status'),
 ]
@@ -1,55 +1,320 @@
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from functools import cached_property
 
 import cv2
 import pytesseract
 import numpy as np
 import face_recognition
+from django.conf import settings
+from PIL import Image
+
+from users.checks import Check, CheckScheduler
 
 os.environ['TESSDATA_PREFIX'] = '/usr/share/tesseract-ocr/5/tessdata/'
 pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
 
+# Long edge, in pixels, images are ingested at before being analyzed
+ID_CARD_LONG_EDGE = 1600
+FACE_LONG_EDGE = 800
+
+# Long edge, in pixels, of the full resolution photos (12MP) the blur threshold was tuned on. Downscaling
+# sharpens an image, so the threshold grows with the downscale factor
+BLUR_THRESHOLD_LONG_EDGE = 4032
+# Votes a horizontal line needs to show that the card is upright, as a fraction of the long edge
+ORIENTATION_LINE_FRACTION = 0.25
+
+
+class OCRBackend:
+    """
+    Base class for OCR engines.
+
+    Methods:
+    has_text: Check if any of the regions of an image has text
+    read_text: Read the text of a region of an image
+    warm_up: Load the engine before the first verification
+    """
+    def has_text(self, image, regions: tuple = ()) -> bool:
+        """
+        Reads the regions of an image in order and stops at the first one with text.
+        :param image: Grayscale numpy array
+        :param regions: Regions as (left, top, right, bottom) fractions of the image size.
+            The whole image is read when no region is given.
+        :return: bool indicating whether text was found
+        """
+        height, width = image.shape[:2]
+        boxes = [
+            (int(left * width), int(top * height), int(right * width), int(bottom * height))
+            for left, top, right, bottom in regions
+        ]
+        for box in boxes or [(0, 0, width, height)]:
+            if self.read_text(image, box).strip():
+                return True
+        return False
+
+    def read_text(self, image, box: tuple) -> str:
+        raise NotImplementedError
+
+    def warm_up(self) -> None:
+        pass
+
+
+class PytesseractBackend(OCRBackend):
+    """
+    OCR with the tesseract binary, started in a subprocess on every call.
+
+    :param lang: Tesseract language
+    """
+    def __init__(self, lang: str):
+        self.lang = lang
+
+    def read_text(self, image, box: tuple) -> str:
+        left, top, right, bottom = box
+        return pytesseract.image_to_string(image[top:bottom, left:right], lang=self.lang)
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    OCR with tesserocr, keeping a pool of Tesseract API handles loaded in the process.
+
+    The language data is loaded once per handle instead of once per call. A handle is used by one
+    thread at a time, so the pool grows up to one handle per concurrent check.
+
+    :param lang: Tesseract language
+    :param size: Maximum number of handles
+    """
+    def __init__(self, lang: str, size: int):
+        self.lang = lang
+        self.size = size
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_api(self):
+        from tesserocr import PyTessBaseAPI
+
+        return PyTessBaseAPI(path=os.environ['TESSDATA_PREFIX'], lang=self.lang)
+
+    @contextmanager
+    def _api(self):
+        try:
+            api = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if not create:
+                api = self._pool.get()
+            else:
+                try:
+                    api = self._create_api()
+                except Exception:
+                    # Otherwise a handle that was never created would count against the size of the pool
+                    with self._lock:
+                        self._created -= 1
+                    raise
+        try:
+            yield api
+        finally:
+            api.Clear()
+            self._pool.put(api)
+
+    def read_text(self, image, box: tuple) -> str:
+        left, top, right, bottom = box
+        with self._api() as api:
+            api.SetImage(Image.fromarray(image))
+            api.SetRectangle(left, top, right - left, bottom - top)
+            return api.GetUTF8Text()
+
+    def warm_up(self) -> None:
+        with self._api():
+            pass
+
+
+_ocr_backend = None
+_ocr_backend_lock = threading.Lock()
+
+
+def get_ocr_backend() -> OCRBackend:
+    """
+    Returns the OCR backend of this process, created on first use.
+
+    tesserocr is used when it is installed, otherwise OCR falls back to pytesseract.
+    :return: OCRBackend
+    """
+    global _ocr_backend
+    if _ocr_backend is None:
+        with _ocr_backend_lock:
+            if _ocr_backend is None:
+                try:
+                    import tesserocr  # noqa: F401
+                except ImportError:
+                    _ocr_backend = PytesseractBackend(settings.IDENTITY_VERIFICATION_OCR_LANG)
+                else:
+                    _ocr_backend = TesserocrBackend(
+                        settings.IDENTITY_VERIFICATION_OCR_LANG, settings.IDENTITY_VERIFICATION_CHECK_THREADS
+                    )
+    return _ocr_backend
+
+
+class ImageFeatures:
+    """
+    Features of an image shared by every check that analyzes it.
+
+    Each feature is computed the first time a check asks for it and reused afterwards, so the
+    grayscale conversion, the edge detection and the contour search run once per image instead of
+    once per check. Checks needing a lower resolution use the features of a downscaled copy,
+    returned by scaled() and memoized as well.
+
+    :param image: numpy array representing the image (BGR)
+
+    Attributes:
+    long_edge: Long edge of the image, in pixels
+    gray: Grayscale copy of the image
+    edges: Canny edges of the grayscale image
+    contours: External contours of the edges
+    face_locations: Locations of the faces found in the image
+    face_encoding: Encoding of the first face found, or None if there is no face
+    gradient_magnitude: Sobel gradient magnitude of the grayscale image
+    """
+    def __init__(self, image):
+        self.image = image
+        self._scaled = {}
+
+    @classmethod
+    def of(cls, image) -> 'ImageFeatures':
+        """
+        Returns the features of an image, reusing them if an ImageFeatures is received.
+        :param image: numpy array or ImageFeatures
+        :return: ImageFeatures
+        """
+        return image if isinstance(image, cls) else cls(image)
+
+    def scaled(self, long_edge: int | None) -> 'ImageFeatures':
+        """
+        Returns the features of a copy of the image downscaled to a long edge. Images are never upscaled.
+        :param long_edge: Long edge in pixels, None to keep the resolution of the image
+        :return: ImageFeatures
+        """
+        height, width = self.image.shape[:2]
+        if long_edge is None or max(height, width) <= long_edge:
+            return self
+        if long_edge not in self._scaled:
+            scale = long_edge / max(height, width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            self._scaled[long_edge] = ImageFeatures(cv2.resize(self.image, size, interpolation=cv2.INTER_AREA))
+        return self._scaled[long_edge]
+
+    @property
+    def long_edge(self) -> int:
+        return max(self.image.shape[:2])
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def edges(self):
+        return cv2.Canny(self.gray, 50, 150)
+
+    @cached_property
+    def contours(self):
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
+    @cached_property
+    def face_locations(self) -> list:
+        return face_recognition.face_locations(self.image)
+
+    @cached_property
+    def face_encoding(self):
+        if not self.face_locations:
+            return None
+        # Encoding with the known location skips a second face detection
+        encodings = face_recognition.face_encodings(self.image, known_face_locations=self.face_locations[:1])
+        return encodings[0] if encodings else None
+
+    @cached_property
+    def gradient_magnitude(self):
+        sobelx = cv2.Sobel(self.gray, cv2.CV_64F, 1, 0, ksize=5)
+        sobely = cv2.Sobel(self.gray, cv2.CV_64F, 0, 1, ksize=5)
+        return cv2.magnitude(sobelx, sobely)
+
+
 class ImageAnalyzer:
     """
     Base class for image analysis.
 
-    :param image: numpy array representing the image
+    :param image: numpy array representing the image, or its ImageFeatures
 
     Methods:
+    get_checks: Checks run by validate
+    validate: Check if the image is valid
     is_blurry: Check if the image is blurry
     has_text: Check if the image has text
     is_cut: Check if the image is cut
     is_correct_orientation: Check if the image is in the correct orientation
     has_face: Check if the image has a face
     """
+    name = 'image'
+    # Regions where text is expected, as (left, top, right, bottom) fractions of the image size
+    ocr_regions = ()
+    # Long edge, in pixels, each check needs. Checks not listed use the ingested resolution
+    check_resolutions = {
+        'is_blurry': 1024,
+        'is_cut': 1024,
+        'is_correct_orientation': 1024,
+        'has_fingerprint': 1024,
+        'has_face': FACE_LONG_EDGE,
+    }
+
     def __init__(self, image):
-        self.image = image
+        self.features = ImageFeatures.of(image)
+        self.image = self.features.image
+
+    def get_checks(self) -> list:
+        return []
+
+    def validate(self, timings: dict = None) -> bool:
+        return CheckScheduler(self.get_checks(), timings).run()
+
+    def features_for(self, check: str) -> ImageFeatures:
+        """
+        Returns the features of the image at the resolution a check needs.
+        :param check: Name of the check method
+        :return: ImageFeatures
+        """
+        return self.features.scaled(self.check_resolutions.get(check))
+
+    def _check(self, method: str, expected: bool = True, parallel: bool = False) -> Check:
+        func = getattr(self, method)
+        return Check(f'{self.name}.{method}', func if expected else lambda: not func(), parallel=parallel)
 
     def is_blurry(self, threshold=40) -> bool:
-        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        features = self.features_for('is_blurry')
+        gray = cv2.GaussianBlur(features.gray, (3, 3), 0)
         laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        return laplacian_var < threshold
+        return laplacian_var < threshold * BLUR_THRESHOLD_LONG_EDGE / features.long_edge
 
     def has_text(self) -> bool:
-        text = pytesseract.image_to_string(self.image)
-        return bool(text.strip())
+        return get_ocr_backend().has_text(self.features_for('has_text').gray, self.ocr_regions)
 
     def is_cut(self, expected_aspect_ratio=(85.6, 53.98)) -> bool:
-        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for contour in contours:
+        expected_ratio = expected_aspect_ratio[0] / expected_aspect_ratio[1]
+        for contour in self.features_for('is_cut').contours:
             x, y, w, h = cv2.boundingRect(contour)
             aspect_ratio = w / h
-            expected_ratio = expected_aspect_ratio[0] / expected_aspect_ratio[1]
             if 0.9 < aspect_ratio / expected_ratio < 1.1:
                 return False
         return True
 
     def is_correct_orientation(self) -> bool:
-        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
+        features = self.features_for('is_correct_orientation')
+        threshold = round(features.long_edge * ORIENTATION_LINE_FRACTION)
+        lines = cv2.HoughLines(features.edges, 1, np.pi / 180, threshold)
         if lines is None:
             return False
         for line in lines:
@@ -57,11 +322,10 @@ class ImageAnalyzer:
             angle = np.degrees(theta)
             if 85 < angle < 95:
                 return True
+        return False
 
     def has_face(self) -> bool:
-        small_image = cv2.resize(self.image, (0, 0), fx=0.5, fy=0.5)
-        face_locations = face_recognition.face_locations(small_image)
-        return len(face_locations) > 0
+        return len(self.features_for('has_face').face_locations) > 0
 
 
 class FrontIdAnalyzer(ImageAnalyzer):
@@ -69,20 +333,20 @@ class FrontIdAnalyzer(ImageAnalyzer):
     Class for analyzing the front of an ID card.
 
     Methods:
-    validate: Check if the image is valid
+    get_checks: Checks run by validate
     """
-    def validate(self) -> bool:
-        if self.is_blurry():
-            return False
-        if not self.has_text():
-            return False
-        if self.is_cut():
-            return False
-        if not self.is_correct_orientation():
-            return False
-        if not self.has_face():
-            return False
-        return True
+    name = 'front_id'
+    # Personal data, to the right of the photo
+    ocr_regions = ((0.3, 0.15, 1.0, 0.85),)
+
+    def get_checks(self) -> list:
+        return [
+            self._check('is_blurry', expected=False),
+            self._check('is_cut', expected=False),
+            self._check('is_correct_orientation'),
+            self._check('has_text', parallel=True),
+            self._check('has_face', parallel=True),
+        ]
 
 
 class BackIdAnalyzer(ImageAnalyzer):
@@ -90,29 +354,24 @@ class BackIdAnalyzer(ImageAnalyzer):
     Class for analyzing the back of an ID card.
 
     Methods:
-    validate: Check if the image is valid
+    get_checks: Checks run by validate
     has_fingerprint: Check if the image has a fingerprint
     """
-    def validate(self):
-        if self.is_blurry():
-            return False
-        if not self.has_text():
-            return False
-        if self.is_cut():
-            return False
-        if not self.is_correct_orientation():
-            return False
-        if not self.has_fingerprint():
-            return False
-        return True
+    name = 'back_id'
+    # Machine readable zone at the bottom, then the data printed at the top
+    ocr_regions = ((0.0, 0.65, 1.0, 1.0), (0.0, 0.0, 1.0, 0.45))
+
+    def get_checks(self) -> list:
+        return [
+            self._check('is_blurry', expected=False),
+            self._check('is_cut', expected=False),
+            self._check('is_correct_orientation'),
+            self._check('has_fingerprint'),
+            self._check('has_text', parallel=True),
+        ]
 
     def has_fingerprint(self) -> bool:
-        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)
-        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)
-        sobel_combined = cv2.sqrt(sobelx ** 2 + sobely ** 2)
-
-        _, binary_image = cv2.threshold(sobel_combined, 100, 255, cv2.THRESH_BINARY)
+        _, binary_image = cv2.threshold(self.features_for('has_fingerprint').gradient_magnitude, 100, 255, cv2.THRESH_BINARY)
 
         contours, _ = cv2.findContours(np.uint8(binary_image), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
@@ -125,32 +384,26 @@ class FaceComparison:
     """
     Class for comparing a face image to an ID card image.
 
-    :param face_image: numpy array representing the face image
-    :param id_image: numpy array representing the ID card image
+    :param face_image: numpy array representing the face image, or its ImageFeatures
+    :param id_image: numpy array representing the ID card image, or its ImageFeatures
 
     Methods:
     compare_faces: Compare the face to the ID card
     :return: bool indicating whether the face matches the ID card
     """
     def __init__(self, face_image, id_image):
-        self.face_image = face_image
-        self.id_image = id_image
+        self.face_features = ImageFeatures.of(face_image)
+        self.id_features = ImageFeatures.of(id_image)
 
     def compare_faces(self):
-        # Resize images for consistency
-        face_image_resized = cv2.resize(self.face_image, (0, 0), fx=0.5, fy=0.5)
-        id_image_resized = cv2.resize(self.id_image, (0, 0), fx=0.5, fy=0.5)
-
-        face_encodings = face_recognition.face_encodings(face_image_resized)
-        id_face_encodings = face_recognition.face_encodings(id_image_resized)
-
-        if len(face_encodings) == 0:
+        # Faces are located and encoded at the resolution used by has_face, once per image
+        face_encoding = self.face_features.scaled(FACE_LONG_EDGE).face_encoding
+        if face_encoding is None:
             return False
-        if len(id_face_encodings) == 0:
+        id_face_encoding = self.id_features.scaled(FACE_LONG_EDGE).face_encoding
+        if id_face_encoding is None:
             return False
 
-        face_encoding = face_encodings[0]
-        id_face_encoding = id_face_encodings[0]
         results = face_recognition.compare_faces([id_face_encoding], face_encoding)
         return results[0]
 
@@ -159,25 +412,86 @@ class IdentityValidator:
     """
     Class for validating the images of a Chilean ID card.
 
+    The checks of both sides of the ID card and the face comparison are run together by a
+    CheckScheduler: cheap checks first, cheapest first, and then the OCR of each side and the face
+    comparison concurrently. The validation stops at the first failing check.
+
+    A side of the ID card already analyzed by a previous verification can be given with its analysis
+    result, and its checks are skipped. The image of the front is still needed to compare its face,
+    the image of the back is not.
+
     :param front_id_image: numpy array representing the front of the ID card
-    :param back_id_image: numpy array representing the back of the ID card
+    :param back_id_image: numpy array representing the back of the ID card, None if back_id_result is given
     :param face_image: numpy array representing the face image
+    :param front_id_result: Analysis of the front of the ID card returned by get_analysis_results
+    :param back_id_result: Analysis of the back of the ID card returned by get_analysis_results
 
     Methods:
+    get_checks: Checks run by validate
     validate: Validate the images
+    get_analysis_results: Outcome of the analysis of each side of the ID card
 
     :return: bool indicating whether the images are valid
     """
-    def __init__(self, front_id_image, back_id_image, face_image):
-        self.front_id_analyzer = FrontIdAnalyzer(front_id_image)
-        self.back_id_analyzer = BackIdAnalyzer(back_id_image)
-        self.face_comparison = FaceComparison(face_image, front_id_image)
+    def __init__(self, front_id_image, back_id_image, face_image, front_id_result=None, back_id_result=None):
+        self.front_id_result = front_id_result
+        self.back_id_result = back_id_result
+        self.front_id_analyzer = FrontIdAnalyzer(front_id_image) if front_id_result is None else None
+        self.back_id_analyzer = BackIdAnalyzer(back_id_image) if back_id_result is None else None
+        # When the front of the ID card is analyzed, the comparison reuses its features
+        self.face_comparison = FaceComparison(
+            face_image, self.front_id_analyzer.features if self.front_id_analyzer is not None else front_id_image
+        )
+        self.check_results = {}
+
+    def get_checks(self) -> list:
+        checks = []
+        if self.front_id_analyzer is not None:
+            checks += [
+                check for check in self.front_id_analyzer.get_checks() if check.name != 'front_id.has_face'
+            ]
+            # The comparison reuses the faces located by has_face, so both run in the same stage
+            face_match = Check(
+                'face_match',
+                lambda: self.front_id_analyzer.has_face() and self.face_comparison.compare_faces(),
+                parallel=True,
+            )
+        else:
+            face_match = Check('face_match', self.face_comparison.compare_faces, parallel=True)
 
-    def validate(self):
-        if not self.front_id_analyzer.validate():
-            return False
-        elif not self.back_id_analyzer.validate():
-            return False
-        elif not self.face_comparison.compare_faces():
-            return False
-        return True
+        if self.back_id_analyzer is not None:
+            checks += self.back_id_analyzer.get_checks()
+        return [*checks, face_match]
+
+    def validate(self, timings: dict = None):
+        for result in (self.front_id_result, self.back_id_result):
+            if result is not None and not result['valid']:
+                return False
+
+        scheduler = CheckScheduler(self.get_checks(), timings)
+        valid = scheduler.run()
+        self.check_results = scheduler.results
+        return valid
+
+    def get_analysis_results(self) -> dict:
+        """
+        Returns the outcome of the checks of each analyzed side of the ID card, once validated.
+
+        A side is valid when all its checks passed and invalid when one of them failed. Sides whose
+        checks did not all run are left out. Only the outcome is returned, never the face of the holder.
+
+        :return: Dict with front_id_image and back_id_image results: {'valid': bool}
+        """
+        results = {}
+        for side, analyzer in (('front_id_image', self.front_id_analyzer), ('back_id_image', self.back_id_analyzer)):
+            if analyzer is None:
+                continue
+            outcomes = [
+                self.check_results.get(check.name)
+                for check in analyzer.get_checks() if check.name != 'front_id.has_face'
+            ]
+            if False in outcomes:
+                results[side] = {'valid': False}
+            elif None not in outcomes:
+                results[side] = {'valid': True}
+        return results
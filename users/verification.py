@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from jelly_backend.one_signal.notification_service import send_push_notification
+from jelly_backend.utils.spool import discard_spooled, read_spooled, spool_upload
+from users.models import IdentityVerificationJob
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIDES = ('front_id_image', 'back_id_image', 'face_image')
+
+# Sides of the ID card whose analysis is reused between attempts of the same user
+CACHED_ANALYSIS_SIDES = ('front_id_image', 'back_id_image')
+# Increase when the checks change, so results of the previous checks are no longer used
+ANALYSIS_CACHE_VERSION = 2
+
+PUSH_MESSAGES = {
+    'A': ('Identidad verificada', 'Tu identidad fue verificada exitosamente.'),
+    'R': ('Verificación fallida', 'No pudimos verificar tu identidad, por favor intenta nuevamente.'),
+}
+
+
+def get_verification_service():
+    """
+    Returns the module that analyzes the images of a verification.
+
+    It loads OpenCV, dlib and Tesseract, so it is imported on first use and only by the processes
+    running verifications, never by web workers or by the other Celery workers.
+    :return: users.verification_service module
+    """
+    from users import verification_service
+
+    return verification_service
+
+
+def spooled_image_path(job_id, side: str) -> str:
+    return os.path.join(settings.IDENTITY_VERIFICATION_SPOOL_DIR, f'{job_id}_{side}')
+
+
+def create_identity_verification_job(user, images: dict) -> IdentityVerificationJob:
+    """
+    Creates a verification job, spools its images and enqueues it in the identity verification queue.
+    :param user: User verifying their identity
+    :param images: Dict with the uploaded front_id_image, back_id_image and face_image
+    :return: The created job
+    """
+    job = IdentityVerificationJob.objects.create(user=user)
+    for side in IMAGE_SIDES:
+        spool_upload(images[side], settings.IDENTITY_VERIFICATION_SPOOL_DIR, f'{job.id}_{side}')
+
+    transaction.on_commit(lambda: enqueue_identity_verification_job(str(job.id)))
+    return job
+
+
+def enqueue_identity_verification_job(job_id: str) -> None:
+    """
+    Sends a job to the identity verification queue. If the broker fails the job is marked as failed,
+    otherwise it would stay pending and block new verifications of the user.
+    :param job_id: ID of the job
+    :return: None
+    """
+    from users.tasks import validate_identity_verification_job
+
+    try:
+        validate_identity_verification_job.delay(job_id=job_id)
+    except Exception:
+        logger.exception('Could not enqueue the identity verification job %s', job_id)
+        IdentityVerificationJob.objects.filter(id=job_id, status='P').update(
+            status='E', error='No se pudo iniciar la verificación.', updated_at=timezone.now()
+        )
+        discard_spooled(*(spooled_image_path(job_id, side) for side in IMAGE_SIDES))
+
+
+def expire_stale_identity_verification_jobs(user) -> int:
+    """
+    Marks as failed the jobs of a user whose worker died or whose message was lost: started jobs not
+    updated within IDENTITY_VERIFICATION_JOB_TIMEOUT and pending jobs not updated within
+    IDENTITY_VERIFICATION_QUEUE_TIMEOUT.
+    :param user: User verifying their identity
+    :return: Number of expired jobs
+    """
+    now = timezone.now()
+    stale_jobs = (
+        Q(status='S', updated_at__lt=now - timedelta(seconds=settings.IDENTITY_VERIFICATION_JOB_TIMEOUT))
+        | Q(status='P', updated_at__lt=now - timedelta(seconds=settings.IDENTITY_VERIFICATION_QUEUE_TIMEOUT))
+    )
+    return user.identity_verification_jobs.filter(stale_jobs).update(
+        status='E', error='La verificación no se completó a tiempo.', updated_at=now
+    )
+
+
+def analysis_cache_key(user_id, side: str, digest: str) -> str:
+    return f'identity_analysis_{ANALYSIS_CACHE_VERSION}_{user_id}_{side}_{digest}'
+
+
+def get_cached_analysis(user_id, digests: dict) -> dict:
+    """
+    Returns the cached analysis of the sides of the ID card already validated for a user.
+    :param user_id: ID of the user
+    :param digests: sha256 of the content of each side
+    :return: Dict with the analysis of each cached side
+    """
+    keys = {analysis_cache_key(user_id, side, digest): side for side, digest in digests.items()}
+    return {keys[key]: result for key, result in cache.get_many(list(keys)).items()}
+
+
+def cache_analysis(user_id, digests: dict, results: dict) -> None:
+    """
+    Caches the analysis of the sides of the ID card, so a retry with the same images skips their checks.
+    :param user_id: ID of the user
+    :param digests: sha256 of the content of each side
+    :param results: Analysis of each side returned by IdentityValidator.get_analysis_results
+    :return: None
+    """
+    if results:
+        cache.set_many(
+            {analysis_cache_key(user_id, side, digests[side]): result for side, result in results.items()},
+            timeout=settings.IDENTITY_VERIFICATION_RESULT_CACHE_TIMEOUT,
+        )
+
+
+def run_identity_verification_job(job_id: str) -> None:
+    """
+    Validates the spooled images of a job and stores the outcome.
+    :param job_id: ID of the job
+    :return: None
+    """
+    paths = [spooled_image_path(job_id, side) for side in IMAGE_SIDES]
+    try:
+        job = IdentityVerificationJob.objects.select_related('user').get(id=job_id)
+    except IdentityVerificationJob.DoesNotExist:
+        discard_spooled(*paths)
+        return
+    # Started jobs are run again, the message is redelivered when the worker running it dies
+    if job.status not in ('P', 'S'):
+        discard_spooled(*paths)
+        return
+
+    job.status = 'S'
+    job.save(update_fields=['status', 'updated_at'])
+
+    service = get_verification_service()
+    try:
+        contents = {side: read_spooled(path) for side, path in zip(IMAGE_SIDES, paths)}
+        digests = {side: hashlib.sha256(contents[side]).hexdigest() for side in CACHED_ANALYSIS_SIDES}
+        cached_analysis = get_cached_analysis(job.user_id, digests)
+        # Only the outcome of a side is cached, the face of the front is encoded again to compare it
+        images = {
+            side: service.decode_image(content, service.IMAGE_LONG_EDGES[side])
+            for side, content in contents.items() if side not in cached_analysis or side == 'front_id_image'
+        }
+
+        if any(image is None for image in images.values()):
+            job.status = 'R'
+            job.error = 'Las imágenes no son válidas.'
+        elif not service.validate_identity_images(job.user_id, images, cached_analysis, digests):
+            job.status = 'R'
+            job.error = 'Verificación fallida, por favor intente nuevamente.'
+        else:
+            job.status = 'A'
+    except Exception:
+        job.status = 'E'
+        job.error = 'No se pudo completar la verificación.'
+        raise
+    finally:
+        with transaction.atomic():
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            if job.status == 'A':
+                job.user.verified_identity = True
+                job.user.save()
+        discard_spooled(*paths)
+
+    if settings.IDENTITY_VERIFICATION_PUSH_ENABLED and job.status in PUSH_MESSAGES:
+        heading, content = PUSH_MESSAGES[job.status]
+        send_push_notification(
+            external_user_id=str(job.user.id),
+            heading=heading,
+            content=content,
+            data={'identity_verification_job_id': str(job.id), 'status': job.status},
+        )
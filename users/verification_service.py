@@ -0,0 +1,85 @@
+import io
+
+import cv2
+import face_recognition
+import numpy as np
+from PIL import Image, ImageOps
+
+from users.checks import get_check_executor
+from users.utils import FACE_LONG_EDGE, ID_CARD_LONG_EDGE, IdentityValidator, get_ocr_backend
+from users.verification import cache_analysis
+
+# Long edge, in pixels, each image is ingested at
+IMAGE_LONG_EDGES = {
+    'front_id_image': ID_CARD_LONG_EDGE,
+    'back_id_image': ID_CARD_LONG_EDGE,
+    'face_image': FACE_LONG_EDGE,
+}
+
+
+def warm_up_identity_verification() -> None:
+    """
+    Loads the face recognition models and the OCR engine in this process, so the first verification
+    handled by a new worker does not pay for it.
+    :return: None
+    """
+    image = np.zeros((FACE_LONG_EDGE // 4, FACE_LONG_EDGE // 4, 3), np.uint8)
+    height, width = image.shape[:2]
+    face_recognition.face_locations(image)
+    face_recognition.face_encodings(image, known_face_locations=[(0, width, height, 0)])
+    get_ocr_backend().warm_up()
+    get_check_executor()
+
+
+def decode_image(data: bytes, long_edge: int):
+    """
+    Decodes an uploaded image at the resolution needed by the verification.
+
+    JPEG images are decoded in draft mode, letting the decoder scale them down while decoding instead
+    of building the full resolution bitmap of the photo. The EXIF orientation is applied once here,
+    so every check receives an upright image.
+
+    :param data: Content of the uploaded file
+    :param long_edge: Maximum long edge of the decoded image, in pixels
+    :return: numpy array (BGR), or None if the file is not a valid image
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        scale = long_edge / max(image.size)
+        if scale < 1:
+            image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+        image = np.asarray(ImageOps.exif_transpose(image).convert('RGB'))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    # The draft is only scaled by powers of two, the rest of the way is done here
+    height, width = image.shape[:2]
+    scale = long_edge / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+
+def validate_identity_images(user_id, images: dict, cached_analysis: dict, digests: dict) -> bool:
+    """
+    Validates the images of a verification, reusing the analysis of the sides of the ID card the user
+    already sent in a previous attempt.
+    :param user_id: ID of the user
+    :param images: Decoded images of the face, of the front and of the back if it is not found in the cache
+    :param cached_analysis: Cached analysis of the sides of the ID card
+    :param digests: sha256 of the content of each side of the ID card
+    :return: bool indicating whether the images are valid
+    """
+    if any(not result['valid'] for result in cached_analysis.values()):
+        return False
+
+    validator = IdentityValidator(
+        images.get('front_id_image'),
+        images.get('back_id_image'),
+        images['face_image'],
+        front_id_result=cached_analysis.get('front_id_image'),
+        back_id_result=cached_analysis.get('back_id_image'),
+    )
+    valid = validator.validate()
+    cache_analysis(user_id, digests, validator.get_analysis_results())
+    return valid
@@ -1,5 +1,3 @@
-import cv2
-import numpy as np
 from django.db import transaction
 from drf_yasg import openapi
 from rest_framework import status
@@ -8,9 +6,9 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 
-from users.models import User
+from users.models import User, IdentityVerificationJob
 from users.serializers import (
-    UserSerializer, UserLoginSerializer, VerifyICSerializer
+    UserSerializer, UserLoginSerializer, VerifyICSerializer, IdentityVerificationJobSerializer
 )
 from jelly_backend.docs.swagger_tags import USER_TAG
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -19,7 +17,7 @@ import os
 from dotenv import load_dotenv
 
 from users.tasks import send_activate_account_email
-from users.utils import IdentityValidator
+from users.verification import create_identity_verification_job, expire_stale_identity_verification_jobs
 from rest_framework.parsers import MultiPartParser, FormParser
 
 load_dotenv()
@@ -174,16 +172,17 @@ class VerifyICAPIView(APIView):
         
         About the endpoint:
         
-        - This endpoint validates the images of a Chilean ID card.
+        - This endpoint starts the validation of the images of a Chilean ID card.
         
         - The user must provide the front and back images of the ID card, as well as an image of their face.
         
-        - The endpoint will return an error if the images are not valid or if the face does not match the ID card.""",
+        - The validation runs in the background. The endpoint returns the id of a verification job whose outcome
+        can be checked in the verification status endpoint.""",
         operation_id="Verify Identity Card",
         tags=USER_TAG,
         operation_summary="Verify Identity Card",
         request_body=VerifyICSerializer,
-        responses={200: openapi.Response("Imágenes validadas exitosamente", VerifyICSerializer)},
+        responses={202: openapi.Response("Verificación en curso", IdentityVerificationJobSerializer)},
     )
     def post(self, request, *args, **kwargs):
         user_id = kwargs.get('user_id')
@@ -195,39 +194,52 @@ class VerifyICAPIView(APIView):
                 'error': 'El usuario no existe.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        verified_identity = user.verified_identity
-
-        if not verified_identity:
-            serializer = self.serializer_class(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            front_id_image = serializer.validated_data['front_id_image']
-            back_id_image = serializer.validated_data['back_id_image']
-            face_image = serializer.validated_data['face_image']
-
-            front_id_image_np = np.frombuffer(front_id_image.read(), np.uint8)
-            back_id_image_np = np.frombuffer(back_id_image.read(), np.uint8)
-            face_image_np = np.frombuffer(face_image.read(), np.uint8)
+        if user.verified_identity:
+            return Response({
+                'error': 'El usuario ya ha verificado su identidad.'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            front_id_image = cv2.imdecode(front_id_image_np, cv2.IMREAD_COLOR)
-            back_id_image = cv2.imdecode(back_id_image_np, cv2.IMREAD_COLOR)
-            face_image = cv2.imdecode(face_image_np, cv2.IMREAD_COLOR)
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-            if front_id_image is None or back_id_image is None or face_image is None:
+        with transaction.atomic():
+            # Locking the user serializes concurrent submissions, so only one of them creates a job
+            user = User.objects.select_for_update().get(id=user.id)
+            expire_stale_identity_verification_jobs(user)
+            if user.identity_verification_jobs.filter(status__in=['P', 'S']).exists():
                 return Response({
-                    'error': 'Las imágenes no son válidas.'
+                    'error': 'Ya hay una verificación en curso.'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            validator = IdentityValidator(front_id_image, back_id_image, face_image)
-            if not validator.validate():
-                return Response({
-                    'error': 'Verificación fallida, por favor intente nuevamente.'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            job = create_identity_verification_job(user, serializer.validated_data)
 
-            user.verified_identity = True
-            user.save()
+        return Response(IdentityVerificationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
+
+class VerifyICStatusAPIView(APIView):
+    permission_classes = [AllowAny]
+    serializer_class = IdentityVerificationJobSerializer
+
+    @swagger_auto_schema(
+        operation_description="""
+        ## Identity Card Verification Status
+        
+        About the endpoint:
+        
+        - This endpoint returns the status of an identity card verification job.
+        
+        - The status is one of: P (Pending), S (Started), A (Approved), R (Rejected) or E (Error).""",
+        operation_id="Verify Identity Card Status",
+        tags=USER_TAG,
+        operation_summary="Identity Card Verification Status",
+        responses={200: IdentityVerificationJobSerializer()},
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            job = IdentityVerificationJob.objects.get(id=kwargs.get('job_id'))
+        except IdentityVerificationJob.DoesNotExist:
             return Response({
-                'error': 'El usuario ya ha verificado su identidad.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+                'error': 'La verificación no existe.'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(self.serializer_class(job).data, status=status.HTTP_200_OK)